@@ -1,20 +1,50 @@
+import base64
+import io
+import logging
+import os
+import tempfile
+import time
+_worker_started = time.perf_counter()
+
 import plotly.graph_objects as go
-from plotly.subplots import make_subplots
-import dash
-from dash import Dash, dcc, Output, Input, State, dash_table, callback
+import flask
+from werkzeug.utils import secure_filename
+from dash import ClientsideFunction, Dash, dcc, Output, Input, State
+from dash.exceptions import PreventUpdate
 import dash_bootstrap_components as dbc
 import dash_core_components as dcc
 import dash_html_components as html
-import pandas as pd
 import numpy as np
-import pvlib
-import datetime
 from datetime import date
-import math
+
+# The solver modules defer pvlib, scipy and pandas to their first use, so none
+# of them is imported before the worker can serve pages
+import jobs
+import layouts
+import metrics
+import sharedcache
+from catalog import load_catalog
+from ivsolver import KEY_PARAMETERS, curve_cache, solve_batch
+from metrics import span
+from ranking import RANK_COLUMNS, rank_modules, technologies
+from search import PAGE_SIZE
+from perftable import load_table
+from ingest import PARAMETER_COLUMNS, extract_parameters, ingest_files
+from fitting import SD_PARAMETERS, fit_files, fit_trace, reference_params
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s %(name)s %(levelname)s: %(message)s')
+log = logging.getLogger('app')
+
+# Seconds spent in each startup phase, logged when the worker is ready and
+# served from /stats/startup; pages add their build time when first rendered
+startup = {'imports': time.perf_counter() - _worker_started}
 
 
 ### Build the app
-app = Dash(__name__, external_stylesheets=[dbc.themes.MINTY], title="IVCurves.com")
+# Background callbacks and /jobs run in a process pool; their state is shared by all workers on the host
+job_queue = jobs.from_env()
+app = Dash(__name__, external_stylesheets=[dbc.themes.MINTY], title="IVCurves.com",
+           background_callback_manager=jobs.BackgroundManager(job_queue))
 server = app.server
 
 # Set up the app's navigation bar with links to the "Home" and "FAQ" pages
@@ -38,73 +68,6 @@ app.layout = html.Div([
     html.Div(id='page-content')
 ])
 
-# Define your app's "FAQ" page layout
-faq_layout = dbc.Container([
-    dbc.Row([
-        dbc.Col([
-            dcc.Markdown("# FAQ")
-        ], width=True),
-    ], align="end"),
-    html.Hr(),
-    dbc.Row([
-        html.H5("What is an IV Curve?"),
-        html.H6("A solar PV (Photovoltaic) IV curve, also known as an I-V curve, is a graphical representation of the electrical characteristics of a photovoltaic module or solar panel. It illustrates the relationship between the current (I) generated by the solar panel and the voltage (V) across its terminals under varying conditions, such as different levels of sunlight and temperature. Analyzing a solar PV IV curve helps assess the module's efficiency, performance, and its ability to generate electricity under different environmental conditions, making it a crucial tool for evaluating and optimizing solar energy systems."),
-        html.Hr(),
-        html.H5("How is a Solar IV Curve Measured?"),
-        html.H6("Solar IV curves are typically measured using a specialized piece of equipment called an IV curve tracer. This device applies different voltage levels to the solar panel and records the resulting current."),
-        html.Hr(),
-        html.H5("What Do the Key Parameters of an IV Curve Mean?"),
-        html.H6("Key parameters include Voc (Open-Circuit Voltage), Isc (Short-Circuit Current), and Pmp (Maximum Power Point, or Pmax). Voc is the maximum voltage with no current, Isc is the maximum current with no voltage, and Pmp is the point of maximum power output."),
-        html.Hr(),
-        html.H5("What Is the Significance of the Open-Circuit Voltage (Voc)?"),
-        html.H6("Voc represents the voltage across the solar panel when there is no current flow. It is an essential parameter as it indicates the maximum potential voltage that the solar panel can generate in open-circuit conditions under specific lighting and temperature conditions."),
-        html.Hr(),
-        html.H5("What Is the Significance of the Short-Circuit Current (Isc)?"),
-        html.H6("Isc represents the maximum current that the solar panel can generate when its terminals are short-circuited. This parameter is crucial for assessing the panel's ability to provide high current under specific lighting and temperature conditions."),
-        html.Hr(),
-        html.H5("What Is the Maximum Power Point (Pmax)?"),
-        html.H6("Pmax is the point on the IV curve where the solar panel generates the highest power output. It is the operating point at which the solar panel is most efficient in converting sunlight into electricity."),
-        html.Hr(),
-        html.H5("What Factors Affect the Shape of an IV Curve?"),
-        html.H6("The shape of an IV curve is influenced by factors such as irradiance (intensity of sunlight), temperature, shading, and degradation of the solar panel. Changes in these factors can alter the curve's shape and parameters."),
-        html.Hr(),
-        html.H5("How Does Temperature Affect the IV Curve?"),
-        html.H6("Temperature affects the IV curve by shifting the curve and changing the values of key parameters. Higher temperatures tend to reduce the open-circuit voltage (Voc) and increase the short-circuit current (Isc), impacting the panel's overall performance."),
-        html.Hr(),
-        html.H5("What Are the Different Operating Points on an IV Curve?"),
-        html.H6("An IV curve has various operating points, including open-circuit voltage (Voc), short-circuit current (Isc), and the maximum power point (Pmax). Understanding these points helps in optimizing the performance of a solar panel."),
-        html.Hr(),
-        html.H5("How Do I Read an IV Curve Graph?"),
-        html.H6("To read an IV curve graph, follow the curve's trajectory. The x-axis represents voltage, and the y-axis represents current. The curve starts at Voc, passes through different voltage-current combinations, and peaks at Pmax."),
-        html.Hr(),
-        html.H5("Why Are IV Curves Important for Solar Panel Testing?"),
-        html.H6("IV curves are essential for evaluating a solar panel's performance and efficiency under different conditions. They help identify issues, degradation, and deviations from expected values, ensuring reliable operation."),
-        html.Hr(),
-        html.H5("How Can IV Curves Help in Diagnosing Solar Panel Issues?"),
-        html.H6("IV curves can diagnose issues by revealing deviations from expected curve shapes and parameter values. Irregularities in the curve can indicate shading, damage, degradation, or electrical faults in the panel."),
-        html.Hr(),
-        html.H5("What Is the Lambert W Method for Calculating IV Curves?"),
-        html.H6("The Lambert W method is a mathematical approach used to calculate IV curves. It is particularly useful when dealing with nonlinear curves and allows for precise determination of key parameters."),
-        html.Hr()
-        ])
-    ])
-# Define your app's "Contact" page layout
-contact_layout = dbc.Container([
-    dbc.Row([
-        dbc.Col([
-            dcc.Markdown("# Contact")
-        ], width=True),
-    ], align="end"),
-    html.Hr(),
-    dbc.Row([
-        html.Iframe(
-            src='https://docs.google.com/forms/d/e/1FAIpQLSe9bizwPKrj5Oaeehhruycgtr7MFDlNSyT3vLJupQnv89QD4g/viewform?embedded=true',
-            width='1000px',
-            height='800px',
-        )
-    ]),
-])
-
 meta_description = "PV solar IV curve database and analysis tool. Explore performance data from thousands of modules like LONGi, Trina, Jinko, Canadian Solar, and more."
 app.index_string = f"""
 <!DOCTYPE html>
@@ -137,176 +100,44 @@ app.index_string = f"""
 </html>
 """
 
-# Module database
-mod_db = pd.read_csv('module_db.csv')
-dropdown_manuf = dcc.Dropdown(options=mod_db['Manufacturer'].unique(), value='LONGi Green Energy Technology Co. Ltd.', clearable=False)
-dropdown_mod = dcc.Dropdown(options=[])
-
-temp_cell = 25
-effective_irradiance = 1000
-
-
-# Parameter dropdown
-dropdown_parameters = dcc.Dropdown(options=['Pmp', 'Power Curve'], clearable=True)
-
-# Scale inputs
-irradiance_input = dbc.Input(type="number", value=1000, min=0, max=1500, step=0.01)
-temperature_input = dbc.Input(type="number", value=25, min=-100, max=100, step=0.01)
-string_input = dbc.Input(type="number", value=1, min=1, max=50, step=1)
-
-# Degrade inputs
-today = datetime.date.today()
-degradation_date_picker = dcc.DatePickerRange(id='degradation-date-range', 
-                                             start_date=date(today.year, today.month, today.day), clearable=True,
-                                             end_date=date(today.year, today.month, today.day))
-degradation_input = dbc.Input(type="number", value=0.5, min=0, max=100, step=0.01)
-
-# IMPORT DATA INPUT
-df_import = pd.DataFrame(columns=['Voltage', 'Current'], index=range(10))
-import_input = dash_table.DataTable(
-    id='import-input',
-    columns=[{'name': col, 'id': col, 'type': 'numeric'} for col in df_import.columns],
-    data=df_import.to_dict('records'),
-    editable=True,
-    style_table={'textAlign': 'center'},
-    style_cell={'textAlign': 'center'},
-    style_header={'textAlign': 'center'},
-)
-
+startup['app'] = time.perf_counter() - _worker_started - startup['imports']
 
+# Module database, loaded once into an indexed catalog (from the binary cache when it is fresh)
+mod_catalog = load_catalog('module_db.csv')
+startup['catalog'] = mod_catalog.load_seconds
+# Precomputed STC/NOCT/grid results, so common operating points skip the solve
+started = time.perf_counter()
+curve_cache.table = load_table(mod_catalog)
+startup['table'] = time.perf_counter() - started
+module_technologies = tuple(technologies(mod_catalog))
+# Solved curves shared by all workers on the host (or via Redis), when configured
+curve_cache.store = sharedcache.from_env(mod_catalog.fingerprint())
 
-home_layout = dbc.Container(
-    [
-        dbc.Row([
-            dbc.Col([
-                dcc.Markdown("# IV Curve Database & Analysis Tool")
-            ], width=True),
-        ], align="end"),
-        html.Hr(),
-        dbc.Row([
-            dbc.Col([
-                dbc.Button("Select module", id="module_button"),
-                dbc.Collapse(
-                    dbc.Card(
-                        dbc.CardBody([
-                            html.H6('Manufacturer:'),
-                            dropdown_manuf,
-                            html.Hr(),
-                            html.H6("Model:"),
-                            dropdown_mod,
-                            html.Hr(),
-                            dbc.Row([  # Create a row for Irradiance, Temperature, and Modules per String
-                                dbc.Col([html.H6("Irradiance (W/m2)"), irradiance_input], width=4),
-                                dbc.Col([html.H6("Temperature (°C)"), temperature_input], width=4),
-                                dbc.Col([html.H6("Modules per String"), string_input], width=4),
-                            ]),
-                            html.Hr(),
-                            dbc.Row([  # Create DataTable for Pmp, Isc, Voc, Imp, Vmp
-                                dbc.Col(dash_table.DataTable(
-                                    id='module-parameters-table',
-                                    columns=[{'name': col, 'id': col, 'type': 'numeric'} for col in ["Pmp", "Isc", "Voc", "Imp", "Vmp"]],
-                                    data=[{}],
-                                    style_table={'textAlign': 'center'},
-                                    style_cell={'textAlign': 'center'},
-                                    style_header={'textAlign': 'center'},
-                                ), width=12),
-                            ]),
-                        ])
-                    ),
-                    id="module_collapse",
-                    is_open=False
-                ),
-                html.Hr(),
-                # ADD PARAMETERS
-                dbc.Button("Add parameters", id="parameter_button"),
-                dbc.Collapse(
-                    dbc.Card(
-                        dbc.CardBody(dropdown_parameters),
-                    ),
-                    id="parameter_collapse",
-                    is_open=False
-                ),
-                html.Hr(),
-                # DEGRADE
-                dbc.Button("Degrade", id="degrade_button"),
-                dbc.Collapse(
-                    dbc.Card(
-                        dbc.CardBody([
-                            html.H6("Install Date --> Measurement Date"),
-                            degradation_date_picker,
-                            html.Hr(),
-                            html.H6("Expected Degradation (%/year):"),
-                            degradation_input
-                        ])
-                    ),
-                    id="degrade_collapse",
-                    is_open=False
-                ),
-                html.Hr(),
-                # IMPORT YOUR DATA
-                dbc.Button("Import your data", id="import_button"),
-                dbc.Collapse(
-                    dbc.Card(
-                        dbc.CardBody([import_input]),
-                    ),
-                    id="import_collapse",
-                    is_open=False
-                ),
-                html.Hr(),
-                # ANALYZE YOUR DATA
-                dbc.Button("Analyze your data", id="analyze_button"),
-                dbc.Collapse(
-                    dbc.Card(
-                        dbc.CardBody([
-                            dbc.Row([  # Create DataTable for Pmp, Isc, Voc, Imp, Vmp
-                                dbc.Col(dash_table.DataTable(
-                                    id='my-parameters-table',
-                                    columns=[{'name': col, 'id': col, 'type': 'numeric'} for col in ["Pmp", "Isc", "Voc", "Imp", "Vmp"]],
-                                    data=[{}],
-                                    style_table={'textAlign': 'center'},
-                                    style_cell={'textAlign': 'center'},
-                                    style_header={'textAlign': 'center'},
-                                ), width=12),
-                            ]),
-                            ]),
-                    ),
-                    id="analyze_collapse",
-                    is_open=False
-                ),
-            ], width=3),
-            dbc.Col([
-                dcc.Graph(id='display', style={'height': '80vh'}),
-            ], width=9, align="start")
-        ]),
-
-        html.Hr(),
-
-        dcc.Markdown("""
-            © 2023 StreetPlant Solar. All Rights Reserved.
-        """)
-
-    ],
-    fluid=True
-)
-                                                   
 # Callbacks
 
 # Define the callback to display the selected page
 @app.callback(Output('page-content', 'children'), Input('url', 'pathname'))
 def display_page(pathname):
+    # Pages are built on first request and cached by the layouts module
+    started = time.perf_counter()
     if pathname == '/faq':
-        return faq_layout
-    if pathname == '/contact':
-        return contact_layout
+        page, name = layouts.faq_page(), 'faq'
+    elif pathname == '/contact':
+        page, name = layouts.contact_page(), 'contact'
     else:
-        return home_layout
+        names, total = mod_catalog.search_manufacturers()
+        page, name = layouts.home_page((tuple(names), total), module_technologies, date.today()), 'home'
+    if name + '_page' not in startup:
+        startup[name + '_page'] = time.perf_counter() - started
+        log.info('Built %s page in %.3fs', name, startup[name + '_page'])
+    return page
 
 def toggle_collapse(n_clicks, is_open):
     if n_clicks:
         return not is_open
     return is_open
 
-menus = ["module", "parameter", "degrade", "import", "analyze"]
+menus = ["module", "parameter", "degrade", "fleet", "compare", "import", "analyze"]
 for menu in menus:
     app.callback(
         Output(f"{menu}_collapse", "is_open"),
@@ -314,181 +145,571 @@ for menu in menus:
         [State(f"{menu}_collapse", "is_open")]
     )(toggle_collapse)
 
+# Dropdowns are searched on the server and only get one page of options at a time
 @app.callback(
-    Output(dropdown_mod, 'options'),
-    Input(dropdown_manuf, 'value')
+    Output('manufacturer-dropdown', 'options'),
+    Input('manufacturer-dropdown', 'search_value'),
+    State('manufacturer-dropdown', 'value')
 )
-def update_dropdown_mod(selected_manuf):
-    dff = mod_db.loc[mod_db['Manufacturer'].str.contains(selected_manuf)]
-    mods_of_manuf = dff.Model
-    return mods_of_manuf
+def search_manufacturer_options(search_value, selected_manuf):
+    names, total = mod_catalog.search_manufacturers(search_value)
+    return layouts.search_options(names, total, search_value, selected_manuf)
 
 @app.callback(
-    Output(dropdown_mod, 'value'),
-    Input(dropdown_mod, 'options')
+    Output('model-dropdown', 'options'),
+    [Input('model-dropdown', 'search_value'), Input('manufacturer-dropdown', 'value')],
+    State('model-dropdown', 'value')
 )
-def update_mod_value(mods_of_manuf):
-    return mods_of_manuf[0]['value']
+def update_dropdown_mod(search_value, selected_manuf, selected_mod):
+    rows, total = mod_catalog.search_models(search_value, selected_manuf)
+    try:
+        mod_catalog.index_of(selected_mod, selected_manuf)
+    except KeyError:
+        # Left over from the previous manufacturer
+        selected_mod = None
+    return layouts.search_options([mod_catalog.models[i] for i in rows], total, search_value, selected_mod)
+
+@app.callback(
+    Output('model-dropdown', 'value'),
+    Input('manufacturer-dropdown', 'value')
+)
+def update_mod_value(selected_manuf):
+    mods_of_manuf = mod_catalog.models_of(selected_manuf)
+    return mods_of_manuf[0] if mods_of_manuf else None
+
 
+# Curves are rounded before they are sent: shorter JSON numbers, far below
+# what the graph can show even for a 50 module string
+VOLTAGE_DECIMALS = 4
+CURRENT_DECIMALS = 4
+
+def compact(values, decimals):
+    return np.round(values, decimals).tolist()
+
+def table_column(data, name):
+    # Numeric column of an editable table; blank or unparseable cells are NaN
+    values = []
+    for row in data:
+        try:
+            values.append(float(row.get(name)))
+        except (TypeError, ValueError):
+            values.append(np.nan)
+    return np.array(values)
 
 @app.callback(
     Output('my-parameters-table', 'data'),
-    Input(import_input, 'data')
+    Input('import-input', 'data')
 )
 def update_my_parameters(data):
     if data:
-        df_import = pd.DataFrame.from_dict(data)
-        df_import['Power'] = df_import['Current'] * df_import['Voltage']
-
-        if not df_import.empty:
-            pmp = round(df_import['Power'].max(), 2)
-            isc = round(df_import['Current'].max(), 2)
-            voc = round(df_import['Voltage'].max(), 2)
-
-            # Find the row where 'Power' is equal to the maximum power (Pmp)
-            row_with_max_power = df_import[df_import['Power'] == df_import['Power'].max()]
-            imp = round(row_with_max_power['Current'].values[0], 2)  # Get the 'Current' value from that row
-            vmp = round(row_with_max_power['Voltage'].values[0], 2)
-            data = [{'Pmp': pmp, 'Isc': isc, 'Voc': voc, 'Imp': imp, 'Vmp': vmp}]
-            return data
+        voltage, current = table_column(data, 'Voltage'), table_column(data, 'Current')
+        try:
+            params = extract_parameters(voltage, current)
+        except ValueError:
+            return [{}]
+        return [{name: round(params[name], 2) for name in PARAMETER_COLUMNS}]
 
     return [{}]
 
 @app.callback(
+    Output('fit-parameters-table', 'data'),
     [
-    Output("display", component_property='figure'),
-    Output('module-parameters-table', 'data')
+        Input('import-input', 'data'),
+        Input('model-dropdown', 'value'),
+        Input('irradiance-input', 'value'),
+        Input('temperature-input', 'value'),
     ],
+    # String length only scales the reference, so editing it alone is not worth a round trip
+    [State('string-input', 'value'), State('manufacturer-dropdown', 'value')]
+)
+def update_fit_parameters(data, selected_mod, selected_irradiance, selected_temperature, mods_per_string, selected_manuf):
+    if not data or not selected_mod or selected_irradiance is None or selected_temperature is None:
+        return []
+    voltage, current = table_column(data, 'Voltage'), table_column(data, 'Current')
+    # The default table is blank rows: nothing to fit, so skip the reference solve
+    if np.count_nonzero(np.isfinite(voltage) & np.isfinite(current)) < 2:
+        return []
+    try:
+        # Raises KeyError while the model dropdown catches up with a new manufacturer
+        index = mod_catalog.index_of(selected_mod, selected_manuf)
+    except KeyError:
+        return []
+    # Warm-start from the selected module at the selected conditions
+    reference = reference_params(mod_catalog, index, selected_irradiance, selected_temperature, mods_per_string or 1)
+    try:
+        fitted = fit_trace(voltage, current, reference)
+    except ValueError:
+        return []
+    return [{'Parameter': name, 'Fitted': '%.4g' % fitted[name], 'Catalog': '%.4g' % reference[name],
+             'Deviation (%)': round(100 * fitted['d_' + name], 1)} for name in SD_PARAMETERS]
+
+# Solves stay on the server; the browser keeps the unscaled curve in the
+# 'base-curve' store and draws the graph from it (see assets/scaling.js)
+@app.callback(
+    Output('base-curve', 'data'),
     [
-        Input(dropdown_mod, 'value'),
-        Input(dropdown_parameters, 'value'),
-        Input(irradiance_input, 'value'),
-        Input(temperature_input, 'value'),
-        Input(string_input, 'value'),
-        Input(degradation_date_picker, 'start_date'),
-        Input(degradation_date_picker, 'end_date'),
-        Input(degradation_input, 'value'),
-        Input(import_input, 'data'),
-    ]
+        Input('model-dropdown', 'value'),
+        Input('irradiance-input', 'value'),
+        Input('temperature-input', 'value'),
+    ],
+    State('manufacturer-dropdown', 'value')
+)
+def create_model_IV(selected_mod, selected_irradiance, selected_temperature, selected_manuf):
+    # Keep the last curve while a field is cleared or being typed
+    if not selected_mod or selected_irradiance is None or selected_temperature is None:
+        raise PreventUpdate
+    with span('catalog_lookup'):
+        try:
+            index = mod_catalog.index_of(selected_mod, selected_manuf)
+        except KeyError:
+            # The model dropdown has not caught up with a new manufacturer yet
+            raise PreventUpdate
+    # Unscaled curve for this module and operating point, solved once and cached
+    with span('curve'):
+        curve_info = curve_cache.get_curve(mod_catalog, index, selected_irradiance, selected_temperature)
+    with span('encode'):
+        base = {name: curve_info[name] for name in KEY_PARAMETERS}
+        base['v'] = compact(curve_info['v'], VOLTAGE_DECIMALS)
+        base['i'] = compact(curve_info['i'], CURRENT_DECIMALS)
+        # Interpolated from the performance table: relative bound of each parameter
+        if 'error_bound' in curve_info:
+            base['error_bound'] = curve_info['error_bound']
+    return base
+
+# String length, degradation, the overlay and imported data only change how the
+# base curve is drawn, so they are applied in the browser without a round trip
+app.clientside_callback(
+    ClientsideFunction(namespace='ivcurves', function_name='scaleCurve'),
+    [Output('display', 'figure'), Output('module-parameters-table', 'data')],
+    [
+        Input('base-curve', 'data'),
+        Input('parameters-dropdown', 'value'),
+        Input('string-input', 'value'),
+        Input('degradation-date-range', 'start_date'),
+        Input('degradation-date-range', 'end_date'),
+        Input('degradation-input', 'value'),
+        Input('import-input', 'data'),
+    ],
+    State('display', 'figure')
 )
 
-def create_model_IV(selected_mod, selected_option, selected_irradiance, selected_temperature, mods_per_string, start_date, end_date, input_degradation_rate, data):
-    selected_module_data = mod_db[mod_db['Model'].str.match(selected_mod)].iloc[0, :]
-
-    cec_params = {
-        'effective_irradiance': selected_irradiance,
-        'temp_cell': selected_temperature,
-        'alpha_sc': selected_module_data.alpha_sc,
-        'a_ref': selected_module_data.a_ref,
-        'I_L_ref': selected_module_data.I_L_ref,
-        'I_o_ref': selected_module_data.I_o_ref,
-        'R_sh_ref': selected_module_data.R_sh_ref,
-        'R_s': selected_module_data.R_s,
-        'Adjust': selected_module_data.Adjust,
-        'EgRef': 1.121,
-        'dEgdT': -0.0002677
-    }
-    IL, I0, Rs, Rsh, nNsVth = pvlib.pvsystem.calcparams_cec(**cec_params)
-
-    curve_info = pvlib.pvsystem.singlediode(
-        photocurrent=IL.flatten(),
-        saturation_current=I0.flatten(),
-        resistance_series=Rs,
-        resistance_shunt=Rsh.flatten(),
-        nNsVth=nNsVth.flatten(),
-        ivcurve_pnts=150,
-        method='lambertw'
-    )
-
-    degradation = 1
-    if start_date and end_date:
-        start_date_object = date.fromisoformat(start_date)
-        end_date_object = date.fromisoformat(end_date)
-        degradation_days = (end_date_object - start_date_object).days
-        if degradation_days > 0:
-            degradation = 1 - (input_degradation_rate / 100 * degradation_days / 365.25)
-
-    df_curve = pd.DataFrame(curve_info['v'].transpose(), columns=['Voltage'])
-    df_curve['Voltage'] *= mods_per_string * math.sqrt(degradation)
-
-    df_curve['Current'] = pd.DataFrame(curve_info['i'].transpose(), columns=['Current'])
-    df_curve['Current'] *= math.sqrt(degradation)
-
-    df_curve['Power'] = df_curve['Voltage'] * df_curve['Current']
-
-    df_Vmp = pd.DataFrame(curve_info['v_mp'].transpose(), columns=['Vmp'])
-    df_Vmp *= mods_per_string * math.sqrt(degradation)
-
-    df_Imp = pd.DataFrame(curve_info['i_mp'].transpose(), columns=['Imp'])
-    df_Imp *= math.sqrt(degradation)
-
-    fig = make_subplots(specs=[[{"secondary_y": True}]])
-
-    fig.add_trace(
+# Limits of the synchronous routes; larger inputs go to the /jobs routes
+SYNC_MAX_RECORDS = int(os.environ.get('SYNC_MAX_RECORDS', 10000))
+SYNC_MAX_FILES = int(os.environ.get('SYNC_MAX_FILES', 20))
+SYNC_MAX_BYTES = int(float(os.environ.get('SYNC_MAX_UPLOAD_MB', 2)) * 2 ** 20)
+# Largest module x condition count of one /jobs/solve request (its result alone is 40 bytes a solve)
+JOB_MAX_SOLVES = int(os.environ.get('JOB_MAX_SOLVES', 1000000))
+
+class InputTooLarge(ValueError):
+    pass
+
+def fleet_projection(selected_mod, selected_manuf, mods_per_string, selected_irradiance, selected_temperature,
+                     start_date, end_date, input_degradation_rate, step, weather=None, progress=None, max_records=None):
+    # pandas comes with the fleet module, on the first projection
+    import pandas as pd
+    from fleet import constant_weather, project_degradation
+    install_date = pd.Timestamp(start_date or date.today())
+    if weather is None:
+        end = pd.Timestamp(end_date) if end_date else install_date
+        if end <= install_date:
+            end = install_date + pd.DateOffset(years=25)
+        weather = constant_weather(install_date, end, selected_irradiance, selected_temperature, step or 'MS')
+    if max_records is not None and len(weather) > max_records:
+        raise InputTooLarge('%d records is more than the %d projected here; POST to /jobs/fleet instead'
+                            % (len(weather), max_records))
+    index = mod_catalog.index_of(selected_mod, selected_manuf)
+    return project_degradation(mod_catalog, index, weather, mods_per_string or 1, install_date, input_degradation_rate or 0,
+                               progress)
+
+fleet_states = [
+    State('model-dropdown', 'value'),
+    State('manufacturer-dropdown', 'value'),
+    State('string-input', 'value'),
+    State('irradiance-input', 'value'),
+    State('temperature-input', 'value'),
+    State('degradation-date-range', 'start_date'),
+    State('degradation-date-range', 'end_date'),
+    State('degradation-input', 'value'),
+    State('fleet-step', 'value'),
+    State('fleet-upload', 'contents'),
+]
+
+def uploaded_weather(contents):
+    if not contents:
+        return None
+    from fleet import read_weather
+    return read_weather(io.BytesIO(base64.b64decode(contents.split(',', 1)[1])))
+
+# Projections run as background jobs, reporting the records solved so far
+@app.callback(
+    [Output('fleet-display', 'figure'), Output('fleet-display', 'style')],
+    Input('fleet-run', 'n_clicks'),
+    fleet_states,
+    background=True,
+    progress=[Output('fleet-progress', 'value'), Output('fleet-progress', 'max')],
+    running=[
+        (Output('fleet-run', 'disabled'), True, False),
+        (Output('fleet-progress', 'style'), {'margin-top': '10px'}, {'display': 'none'}),
+    ],
+    prevent_initial_call=True
+)
+def update_fleet_projection(set_progress, n_clicks, *states):
+    projection = fleet_projection(*states[:-1], weather=uploaded_weather(states[-1]),
+                                  progress=lambda done, total: set_progress((done, total)))
+    fig = go.Figure(
         go.Scatter(
-            x=df_curve['Voltage'],
-            y=df_curve['Current'],
-            name="Modeled IV",
+            x=projection['Timestamp'],
+            y=projection['Pmp'],
+            name="Degraded Pmp",
             mode="lines",
             line_color="#78c2ad",
             showlegend=False
         )
     )
-    fig.update_xaxes(title_text="Voltage (V)")
-    fig.update_yaxes(title_text="Current (A)", secondary_y=False)
-    fig.update_layout(hovermode="closest")
-
-    if selected_option == "Pmp":
-        fig.add_trace(
-            go.Scatter(
-                x=df_Vmp['Vmp'],
-                y=df_Imp['Imp'],
-                name="Pmp",
-                line_color="#007bff",
-                showlegend=False
-            ),
-            secondary_y=False
-        )
-
-    if selected_option == "Power Curve":
-        fig.add_trace(
-            go.Scatter(
-                x=df_curve['Voltage'],
-                y=df_curve['Power'],
-                name="Modeled Power",
-                mode="lines",
-                line_color="#f3969a",
-                showlegend=False
-            ),
-            secondary_y=True
-        )
-        fig.update_yaxes(title_text="Power (W)", secondary_y=True)
+    fig.update_xaxes(title_text="Date")
+    fig.update_yaxes(title_text="Pmp (W)")
+    return fig, {'height': '50vh'}
 
-    df_import = pd.DataFrame.from_dict(data)
-
-    fig.add_trace(
-        go.Scatter(
-            x=df_import['Voltage'],
-            y=df_import['Current'],
-            name="Your module",
-            mode="lines",
-            line_color="#ffce67",
-            showlegend=False
-        ),
-        secondary_y=False
-    )
-
-    pmp = round(df_curve['Power'].max(), 2)
-    isc = round(df_curve['Current'].max(), 2)
-    voc = round(df_curve['Voltage'].max(), 2)
-
-    # Find the row where 'Power' is equal to the maximum power (Pmp)
-    df_mpp = df_curve[df_curve['Power'] == df_curve['Power'].max()]
-    imp = round(df_mpp['Current'].values[0], 2)  # Get the 'Current' value from that row
-    vmp = round(df_mpp['Voltage'].values[0], 2)
-    data = [{'Pmp': pmp, 'Isc': isc, 'Voc': voc, 'Imp': imp, 'Vmp': vmp}]
+@app.callback(
+    Output('fleet-download', 'data'),
+    Input('fleet-download-button', 'n_clicks'),
+    fleet_states,
+    background=True,
+    running=[(Output('fleet-download-button', 'disabled'), True, False)],
+    prevent_initial_call=True
+)
+def download_fleet_projection(n_clicks, *states):
+    projection = fleet_projection(*states[:-1], weather=uploaded_weather(states[-1]))
+    return dcc.send_data_frame(projection.to_csv, 'fleet_projection.csv', index=False, float_format='%.4f')
 
-    return fig, data
+# Catalog modules matching the compare filters, ranked at the selected conditions
+@app.callback(
+    [Output('compare-table', 'data'), Output('compare-summary', 'children'), Output('compare-results', 'style')],
+    Input('compare-run', 'n_clicks'),
+    [
+        State('compare-technology', 'value'),
+        State('compare-bifacial', 'value'),
+        State('compare-stc-min', 'value'),
+        State('compare-stc-max', 'value'),
+        State('compare-cells-min', 'value'),
+        State('compare-cells-max', 'value'),
+        State('compare-area-min', 'value'),
+        State('compare-area-max', 'value'),
+        State('compare-by', 'value'),
+        State('compare-top', 'value'),
+        State('irradiance-input', 'value'),
+        State('temperature-input', 'value'),
+    ],
+    background=True,
+    progress=[Output('compare-progress', 'value'), Output('compare-progress', 'max')],
+    running=[
+        (Output('compare-run', 'disabled'), True, False),
+        (Output('compare-progress', 'style'), {'margin-top': '10px'}, {'display': 'none'}),
+    ],
+    prevent_initial_call=True
+)
+def update_compare(set_progress, n_clicks, technology, bifacial, stc_min, stc_max, cells_min, cells_max, area_min, area_max,
+                   rank_by, top, selected_irradiance, selected_temperature):
+    # Empty or out of range while being typed
+    if top is None or top < 1:
+        raise PreventUpdate
+    filters = {
+        'technology': technology,
+        'bifacial': {'yes': True, 'no': False}.get(bifacial),
+        'stc_min': stc_min, 'stc_max': stc_max,
+        'cells_min': cells_min, 'cells_max': cells_max,
+        'area_min': area_min, 'area_max': area_max,
+    }
+    try:
+        ranked = rank_modules(mod_catalog, selected_irradiance, selected_temperature, filters, rank_by, top,
+                              curve_cache.table, progress=lambda done, total: set_progress((done, total)))
+    except ValueError as e:
+        return [], str(e), {'display': 'block'}
+    decimals = {'STC': 1, 'A_c': 3, 'Pmp': 2, 'W/m2': 1, 'Efficiency (%)': 2}
+    data = [{col: round(float(value), decimals[col]) if col in decimals else value for col, value in zip(RANK_COLUMNS, row)}
+            for row in zip(*[ranked[col].tolist() for col in RANK_COLUMNS])]
+    for row in data:
+        row['Bifacial'] = 'Yes' if row['Bifacial'] else 'No'
+    summary = 'Top %d of %d matching modules at %s W/m2 and %s C' % (len(data), ranked['matched'],
+                                                                   selected_irradiance, selected_temperature)
+    return data, summary, {'display': 'block'}
+
+def projection_args(args):
+    # fleet_projection arguments from request values
+    return (args['model'], args.get('manufacturer'), int(args.get('modules', 1)),
+            float(args.get('irradiance', 1000)), float(args.get('temperature', 25)),
+            args.get('start'), args.get('end'), float(args.get('rate', 0.5)), args.get('step', 'MS'))
+
+# Streamed projection table. GET projects fixed conditions over a date range;
+# POST a "weather" CSV file to project a measured or typical-year series.
+# Small inputs only (SYNC_MAX_RECORDS records): longer projections use /jobs/fleet.
+@server.route('/fleet/projection.csv', methods=['GET', 'POST'])
+def fleet_projection_csv():
+    from fleet import iter_csv, read_weather
+    if (flask.request.content_length or 0) > SYNC_MAX_BYTES:
+        return 'Weather file too large here; POST it to /jobs/fleet instead.', 413
+    try:
+        weather = None
+        if 'weather' in flask.request.files:
+            weather = read_weather(flask.request.files['weather'].stream)
+        projection = fleet_projection(*projection_args(flask.request.values), weather=weather,
+                                      max_records=SYNC_MAX_RECORDS)
+    except KeyError as e:
+        return 'Unknown or missing module: %s' % e, 400
+    except InputTooLarge as e:
+        return str(e), 413
+    except ValueError as e:
+        return str(e), 400
+    return flask.Response(iter_csv(projection), mimetype='text/csv',
+                          headers={'Content-Disposition': 'attachment; filename=fleet_projection.csv'})
+
+# Module search for other clients: q (words matched by prefix against model and
+# manufacturer names), optional manufacturer, page and size; returns one page
+@server.route('/search/modules')
+def search_modules():
+    args = flask.request.args
+    try:
+        page, size = int(args.get('page', 0)), min(max(int(args.get('size', PAGE_SIZE)), 1), 1000)
+    except ValueError as e:
+        return str(e), 400
+    rows, total = mod_catalog.search_models(args.get('q', ''), args.get('manufacturer'), page, size)
+    manufs = mod_catalog.columns['Manufacturer']
+    return flask.jsonify({'total': total, 'page': page, 'size': size,
+                          'results': [{'model': mod_catalog.models[i], 'manufacturer': manufs[i]} for i in rows]})
+
+# Latency histograms of every callback and solver stage, for Prometheus
+@server.route('/metrics')
+def prometheus_metrics():
+    cache = curve_cache.stats()
+    counters = [('ivcurves_iv_cache_lookups_total', 'IV curve cache lookups by result.',
+                 {'result="%s"' % name: cache[name] for name in ('hits', 'misses', 'table_hits', 'interpolated', 'shared_hits')}),
+                ('ivcurves_iv_cache_evictions_total', 'Curves evicted from the IV curve cache.', {'': cache['evictions']})]
+    gauges = [('ivcurves_startup_seconds', 'Worker startup time by phase.',
+               {'phase="%s"' % name: '%.6f' % seconds for name, seconds in startup.items()})]
+    return flask.Response(metrics.render(gauges, counters), mimetype='text/plain; version=0.0.4')
+
+# Collapsed stacks from the sampling profiler (only with SAMPLING_PROFILER_INTERVAL
+# set); ?reset=1 starts a new profile
+@server.route('/metrics/profile')
+def sampling_profile():
+    if profiler is None:
+        return 'Sampling profiler is off; set SAMPLING_PROFILER_INTERVAL (ms) to enable it.', 404
+    return flask.Response(profiler.collapsed(reset=bool(flask.request.args.get('reset'))), mimetype='text/plain')
+
+# Startup phase timings, for tracking cold starts
+@server.route('/stats/startup')
+def startup_stats():
+    return flask.jsonify(startup)
+
+# Hit/miss/eviction counters for sizing the IV curve cache
+@server.route('/stats/iv-cache')
+def iv_cache_stats():
+    return flask.jsonify(curve_cache.stats())
+
+def save_uploads(uploads, directory):
+    # Uploaded files get numbered names, so duplicates from different folders survive
+    for n, upload in enumerate(uploads):
+        name = secure_filename(upload.filename or '') or 'trace.csv'
+        upload.save(os.path.join(directory, '%05d_%s' % (n, name)))
+
+def csv_attachment(path, filename):
+    with open(path, 'rb') as f:
+        content = f.read()
+    return flask.Response(content, mimetype='text/csv', headers={'Content-Disposition': 'attachment; filename=' + filename})
+
+def process_traces(upload_dir, output, fit=False, reference=None, progress=None):
+    # Summary (or fit) rows of every uploaded trace into the CSV output
+    # One process by default: requests and jobs run in every web worker at once
+    workers = max(int(os.environ.get('INGEST_WORKERS', 1)), 1)
+    if fit:
+        fit_files([upload_dir], output, reference, workers=workers, relative_to=upload_dir, progress=progress)
+    else:
+        ingest_files([upload_dir], output, workers=workers, relative_to=upload_dir, progress=progress)
+
+def uploads_too_large(uploads, job_route):
+    # 413 response for the synchronous trace routes, or None
+    if len(uploads) > SYNC_MAX_FILES or (flask.request.content_length or 0) > SYNC_MAX_BYTES:
+        return ('At most %d files and %d MB are processed here; POST them to %s instead.'
+                % (SYNC_MAX_FILES, SYNC_MAX_BYTES // 2 ** 20, job_route)), 413
+    return None
+
+def fit_reference(args):
+    # Catalog module parameters to warm-start fits from, if a model is given; KeyError if unknown
+    if not args.get('model'):
+        return None
+    index = mod_catalog.index_of(args['model'], args.get('manufacturer'))
+    return reference_params(mod_catalog, index, float(args.get('irradiance', 1000)),
+                            float(args.get('temperature', 25)), int(args.get('modules', 1)))
+
+# IV trace ingestion: POST one or more tracer CSV files as "files" and get back
+# one row of extracted parameters per trace. Small uploads only (SYNC_MAX_FILES
+# files, SYNC_MAX_UPLOAD_MB); bulk uploads use /jobs/ingest.
+@server.route('/ingest', methods=['POST'])
+def ingest_traces():
+    uploads = flask.request.files.getlist('files')
+    if not uploads:
+        return 'Upload one or more IV trace CSV files in the "files" field.', 400
+    too_large = uploads_too_large(uploads, '/jobs/ingest')
+    if too_large:
+        return too_large
+    with tempfile.TemporaryDirectory() as tmp:
+        upload_dir = os.path.join(tmp, 'traces')
+        os.mkdir(upload_dir)
+        save_uploads(uploads, upload_dir)
+        summary_path = os.path.join(tmp, 'summary.csv')
+        process_traces(upload_dir, summary_path)
+        return csv_attachment(summary_path, 'iv_trace_summary.csv')
+
+# Single-diode fits: POST tracer CSV files as "files", plus optionally the
+# catalog module (model, manufacturer) and conditions (irradiance, temperature,
+# modules) to warm-start from and compare against; returns one row per trace.
+# Small uploads only, as for /ingest; bulk fits use /jobs/fit.
+@server.route('/fit', methods=['POST'])
+def fit_traces():
+    uploads = flask.request.files.getlist('files')
+    if not uploads:
+        return 'Upload one or more IV trace CSV files in the "files" field.', 400
+    too_large = uploads_too_large(uploads, '/jobs/fit')
+    if too_large:
+        return too_large
+    try:
+        reference = fit_reference(flask.request.values)
+    except KeyError:
+        return 'Unknown module: %s' % flask.request.values['model'], 400
+    with tempfile.TemporaryDirectory() as tmp:
+        upload_dir = os.path.join(tmp, 'traces')
+        os.mkdir(upload_dir)
+        save_uploads(uploads, upload_dir)
+        fits_path = os.path.join(tmp, 'fits.csv')
+        process_traces(upload_dir, fits_path, fit=True, reference=reference)
+        return csv_attachment(fits_path, 'iv_trace_fits.csv')
+
+# Job functions: run in the job pool as func(progress, *args) and return the result kept under the job ID
+
+def fleet_job(progress, args, weather_csv):
+    from fleet import read_weather
+    weather = read_weather(io.BytesIO(weather_csv)) if weather_csv else None
+    projection = fleet_projection(*args, weather=weather, progress=progress)
+    return projection.to_csv(index=False, float_format='%.4f')
+
+def traces_job(progress, job_dir, fit, reference):
+    # Uploads are in job_dir/traces; the queue removes the directory when the job ends
+    output = os.path.join(job_dir, 'result.csv')
+    process_traces(os.path.join(job_dir, 'traces'), output, fit, reference, progress)
+    with open(output) as f:
+        return f.read()
+
+def solve_job(progress, indices, irradiance, temperature):
+    with np.errstate(all='ignore'):
+        solved = solve_batch(mod_catalog, irradiance, temperature, indices=indices, progress=progress)
+    result = {
+        'model': [mod_catalog.models[i] for i in indices],
+        'manufacturer': mod_catalog.columns['Manufacturer'][indices].tolist(),
+        'irradiance': irradiance,
+        'temperature': temperature,
+    }
+    for name in KEY_PARAMETERS:
+        result[name] = solved[name].round(4)
+    return result
+
+# CSV results are served as these attachments; other results as JSON
+JOB_FILENAMES = {'fleet': 'fleet_projection.csv', 'ingest': 'iv_trace_summary.csv', 'fit': 'iv_trace_fits.csv'}
+
+def job_accepted(job_id):
+    return flask.jsonify({'id': job_id, 'status': '/jobs/%s' % job_id, 'result': '/jobs/%s/result' % job_id}), 202
+
+def trace_uploads_job(fit, reference=None):
+    uploads = flask.request.files.getlist('files')
+    if not uploads:
+        return 'Upload one or more IV trace CSV files in the "files" field.', 400
+    job_dir = tempfile.mkdtemp(prefix='ivcurves-job-')
+    os.mkdir(os.path.join(job_dir, 'traces'))
+    save_uploads(uploads, os.path.join(job_dir, 'traces'))
+    return job_accepted(job_queue.submit('fit' if fit else 'ingest', traces_job, job_dir, fit, reference,
+                                         cleanup=[job_dir]))
+
+# Background jobs: POST the arguments of /fleet/projection.csv, /ingest or /fit
+# to /jobs/fleet, /jobs/ingest or /jobs/fit, or a batch solve to /jobs/solve,
+# and get a job ID back at once (202). GET /jobs/<id> gives its state and
+# progress, /jobs/<id>/result its result once done; DELETE cancels it.
+@server.route('/jobs/fleet', methods=['POST'])
+def submit_fleet_job():
+    try:
+        args = projection_args(flask.request.values)
+        mod_catalog.index_of(args[0], args[1])
+    except KeyError as e:
+        return 'Unknown or missing module: %s' % e, 400
+    except ValueError as e:
+        return str(e), 400
+    weather = flask.request.files['weather'].read() if 'weather' in flask.request.files else None
+    return job_accepted(job_queue.submit('fleet', fleet_job, args, weather))
+
+@server.route('/jobs/ingest', methods=['POST'])
+def submit_ingest_job():
+    return trace_uploads_job(fit=False)
+
+@server.route('/jobs/fit', methods=['POST'])
+def submit_fit_job():
+    try:
+        reference = fit_reference(flask.request.values)
+    except KeyError:
+        return 'Unknown module: %s' % flask.request.values['model'], 400
+    return trace_uploads_job(fit=True, reference=reference)
+
+# JSON body: "modules" (a list of {"model", "manufacturer"}; every catalog module
+# when omitted) and "irradiance" and "temperature" (numbers or equal-length lists);
+# the result has the key parameters of every module at every condition
+@server.route('/jobs/solve', methods=['POST'])
+def submit_solve_job():
+    body = flask.request.get_json(silent=True) or {}
+    try:
+        if body.get('modules'):
+            indices = [mod_catalog.index_of(module['model'], module.get('manufacturer')) for module in body['modules']]
+        else:
+            indices = list(range(len(mod_catalog)))
+        irradiance = np.atleast_1d(np.asarray(body.get('irradiance', 1000), dtype=np.float64))
+        temperature = np.atleast_1d(np.asarray(body.get('temperature', 25), dtype=np.float64))
+        irradiance, temperature = np.broadcast_arrays(irradiance, temperature)
+        if irradiance.ndim != 1:
+            raise ValueError('irradiance and temperature must be numbers or lists')
+    except KeyError as e:
+        return 'Unknown or missing module: %s' % e, 400
+    except (TypeError, ValueError) as e:
+        return str(e), 400
+    if len(indices) * len(irradiance) > JOB_MAX_SOLVES:
+        return ('%d modules x %d conditions is more than the %d solves of one job; split the request'
+                % (len(indices), len(irradiance), JOB_MAX_SOLVES)), 413
+    return job_accepted(job_queue.submit('solve', solve_job, indices, irradiance.tolist(), temperature.tolist()))
+
+@server.route('/jobs/<job_id>', methods=['GET', 'DELETE'])
+def job_status(job_id):
+    record = job_queue.cancel(job_id) if flask.request.method == 'DELETE' else job_queue.status(job_id)
+    if record is None:
+        return 'Unknown or expired job: %s' % job_id, 404
+    return flask.jsonify(record)
+
+@server.route('/jobs/<job_id>/result')
+def job_result(job_id):
+    from plotly.io.json import to_json_plotly
+    result = job_queue.result(job_id)
+    if result is jobs.MISSING:
+        record = job_queue.status(job_id)
+        if record is None:
+            return 'Unknown or expired job: %s' % job_id, 404
+        return flask.jsonify(record), 409
+    if isinstance(result, str):
+        filename = JOB_FILENAMES.get(job_queue.status(job_id)['kind'], 'result.csv')
+        return flask.Response(result, mimetype='text/csv', headers={'Content-Disposition': 'attachment; filename=' + filename})
+    return flask.Response(to_json_plotly(result), mimetype='application/json')
+
+# Every callback above and every request is timed into the /metrics histograms
+metrics.instrument_callbacks(app)
+metrics.instrument_requests(server)
+profiler = metrics.SamplingProfiler.from_env()
+
+startup['total'] = time.perf_counter() - _worker_started
+log.info('Worker ready in %.3fs (imports %.3fs, app %.3fs, catalog load %.3fs, table %.3fs)', startup['total'],
+         startup['imports'], startup['app'], startup['catalog'], startup['table'])
 
 if __name__=='__main__':
     app.run_server(port=8053, debug=False)
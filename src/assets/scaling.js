@@ -0,0 +1,74 @@
+// Clientside callbacks. Dash loads every script in assets/ with the page.
+window.dash_clientside = Object.assign({}, window.dash_clientside, {
+    ivcurves: {
+        // Draws the IV graph from the unscaled base curve in the 'base-curve'
+        // store. String length and degradation only rescale that curve, so
+        // changing them (or the overlay, or the imported data) never reaches
+        // the server. Trace positions match layouts.iv_figure.
+        scaleCurve: function(base, option, modsPerString, startDate, endDate, degradationRate, rows, figure) {
+            var noUpdate = window.dash_clientside.no_update;
+            if (!base || !figure || !(modsPerString > 0)) {
+                return [noUpdate, noUpdate];
+            }
+
+            var degradation = 1;
+            if (startDate && endDate) {
+                var days = (Date.parse(endDate) - Date.parse(startDate)) / 86400000;
+                if (days > 0) {
+                    degradation = 1 - (degradationRate || 0) / 100 * days / 365.25;
+                }
+            }
+
+            // String length scales voltage; degradation scales voltage and current by sqrt(degradation)
+            var vScale = modsPerString * Math.sqrt(degradation);
+            var iScale = Math.sqrt(degradation);
+            var voltage = base.v.map(function(v) { return v * vScale; });
+            var current = base.i.map(function(i) { return i * iScale; });
+            var showPmp = option === 'Pmp';
+            var showPower = option === 'Power Curve';
+
+            var data = figure.data.slice();
+            function setTrace(k, props) {
+                data[k] = Object.assign({}, data[k], props);
+            }
+            setTrace(0, {x: voltage, y: current});
+            setTrace(1, {x: [base.v_mp * vScale], y: [base.i_mp * iScale], visible: showPmp});
+            setTrace(2, {
+                x: showPower ? voltage : [],
+                y: showPower ? voltage.map(function(v, k) { return v * current[k]; }) : [],
+                visible: showPower
+            });
+            setTrace(3, {
+                x: (rows || []).map(function(row) { return row.Voltage; }),
+                y: (rows || []).map(function(row) { return row.Current; })
+            });
+            var layout = Object.assign({}, figure.layout, {
+                yaxis2: Object.assign({}, figure.layout.yaxis2, {visible: showPower})
+            });
+
+            // Exact key parameters from the solver, scaled like the curve
+            function round2(x) { return Math.round(x * 100) / 100; }
+            var table = [{
+                Pmp: round2(base.p_mp * vScale * iScale),
+                Isc: round2(base.i_sc * iScale),
+                Voc: round2(base.v_oc * vScale),
+                Imp: round2(base.i_mp * iScale),
+                Vmp: round2(base.v_mp * vScale)
+            }];
+            // Interpolated parameters: their relative error bound, which scaling does not change
+            var bound = base.error_bound;
+            if (bound) {
+                function percent(x) { return '\u00b1' + Number((x * 100).toPrecision(2)) + '%'; }
+                table.push({
+                    Pmp: percent(bound.p_mp),
+                    Isc: percent(bound.i_sc),
+                    Voc: percent(bound.v_oc),
+                    Imp: percent(bound.i_mp),
+                    Vmp: percent(bound.v_mp)
+                });
+            }
+
+            return [Object.assign({}, figure, {data: data, layout: layout}), table];
+        }
+    }
+});
@@ -0,0 +1,4 @@
+"""Offline benchmarks for the solver and app. Run from src/, e.g.
+
+    python -m benchmarks.bench_batch
+"""
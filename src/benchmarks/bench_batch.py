@@ -0,0 +1,61 @@
+"""Batch IV solve vs looping the per-module solve over the catalog.
+
+    python -m benchmarks.bench_batch [--sample 300] [--conditions 4] [--points 0]
+
+The loop is timed on a random sample of modules and extrapolated to the
+whole catalog; the batch path is timed on the whole catalog. The loop
+always solves a curve (150 points unless --points is given), as the app
+callback does.
+"""
+import argparse
+import time
+
+import numpy as np
+
+from catalog import load_catalog
+from ivsolver import solve_batch, solve_curve
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--csv', default='module_db.csv')
+    parser.add_argument('--sample', type=int, default=300, help='modules to time in the per-module loop')
+    parser.add_argument('--conditions', type=int, default=4, help='operating conditions per module')
+    parser.add_argument('--points', type=int, default=0, help='curve points to return (0 = key parameters only)')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    catalog = load_catalog(args.csv)
+    rng = np.random.default_rng(args.seed)
+    irradiance = rng.uniform(200, 1200, args.conditions).round(2)
+    temperature = rng.uniform(-10, 70, args.conditions).round(2)
+    sample = rng.choice(len(catalog), size=min(args.sample, len(catalog)), replace=False)
+    loop_points = args.points or 150
+
+    started = time.perf_counter()
+    looped = np.empty((len(sample), args.conditions))
+    with np.errstate(all='ignore'):
+        for row, index in enumerate(sample):
+            params = catalog.cec_params(index)
+            for col in range(args.conditions):
+                looped[row, col] = solve_curve(params, irradiance[col], temperature[col], loop_points)['p_mp']
+    loop_seconds = time.perf_counter() - started
+    loop_rate = len(sample) * args.conditions / loop_seconds
+
+    started = time.perf_counter()
+    batch = solve_batch(catalog, irradiance, temperature, points=args.points or None)
+    batch_seconds = time.perf_counter() - started
+    batch_rate = len(catalog) * args.conditions / batch_seconds
+
+    # Both paths use the same Lambert-W solution, so Pmp should agree closely
+    diff = np.abs(batch['p_mp'][sample] - looped)
+    print('modules x conditions: %d x %d, curve points: %s' % (len(catalog), args.conditions, args.points or 'none'))
+    print('per-module loop: %9.0f solves/s  (%d sampled, full catalog ~%.1fs)'
+          % (loop_rate, len(sample), len(catalog) * args.conditions / loop_rate))
+    print('batch:           %9.0f solves/s  (full catalog %.2fs)' % (batch_rate, batch_seconds))
+    print('speedup:         %9.1fx' % (batch_rate / loop_rate))
+    print('max |dPmp| vs loop: %.2e W' % np.nanmax(diff))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,193 @@
+"""Load test of the IV solver path and the Dash callback endpoints in one worker.
+
+    python -m benchmarks.bench_endpoints [--requests 300] [--save-baseline] [--tolerance 0.25]
+
+Every scenario runs in-process: the solver through the curve cache, and the
+create_model_IV and update_my_parameters callbacks through the full Dash
+dispatch (POST /_dash-update-component on the Flask test client), with
+random catalog modules and operating conditions. For each one the p50, p95
+and p99 latency, the throughput and the peak Python memory are reported.
+
+Results are compared with the saved baseline (.benchmarks/endpoints.json
+unless --baseline is given) and the run fails when a latency or throughput
+regresses by more than --tolerance. --save-baseline records the run as the
+new baseline. Baselines are machine specific and are not committed.
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import resource
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+BASELINE = os.path.join('.benchmarks', 'endpoints.json')
+METRICS = ('p50_ms', 'p95_ms', 'p99_ms', 'throughput')
+
+
+def random_conditions(catalog, count, rng):
+    # (row, irradiance, temperature) for modules with usable CEC parameters
+    usable = np.flatnonzero(np.all([np.isfinite(values) for values in catalog.cec.values()], axis=0))
+    rows = rng.choice(usable, size=count)
+    irradiance = rng.uniform(100, 1200, count).round(2)
+    temperature = rng.uniform(-10, 70, count).round(2)
+    return list(zip(rows.tolist(), irradiance.tolist(), temperature.tolist()))
+
+
+class DashClient:
+    """Posts callback requests the way the browser does."""
+
+    def __init__(self, app):
+        self.client = app.server.test_client()
+        self.dependencies = {dep['output']: dep for dep in self.client.get('/_dash-dependencies').get_json()}
+
+    def request(self, output, inputs, state=()):
+        dep = self.dependencies[output]
+        component, prop = output.split('.')
+        return {
+            'output': output,
+            'outputs': {'id': component, 'property': prop},
+            'inputs': [dict(spec, value=value) for spec, value in zip(dep['inputs'], inputs)],
+            'state': [dict(spec, value=value) for spec, value in zip(dep.get('state', []), state)],
+            'changedPropIds': [dep['inputs'][0]['id'] + '.' + dep['inputs'][0]['property']],
+        }
+
+    def post(self, body):
+        response = self.client.post('/_dash-update-component', json=body)
+        if response.status_code != 200:
+            raise RuntimeError('%s returned %d' % (body['output'], response.status_code))
+        return response
+
+
+def scenarios(app, catalog, count, rng):
+    # name -> list of zero-argument calls, built up front so only the calls are timed
+    from ivsolver import curve_cache
+
+    manufs = catalog.columns['Manufacturer']
+    dash_client = DashClient(app)
+    conditions = random_conditions(catalog, count, rng)
+
+    def solve(row, irradiance, temperature):
+        return lambda: curve_cache.get_curve(catalog, row, irradiance, temperature)
+
+    def model_iv(row, irradiance, temperature):
+        body = dash_client.request('base-curve.data', [catalog.models[row], irradiance, temperature], [manufs[row]])
+        return lambda: dash_client.post(body)
+
+    def my_parameters(row, irradiance, temperature):
+        # A measured-looking trace: the modeled curve with a little noise
+        curve = curve_cache.get_curve(catalog, row, irradiance, temperature, points=40, sampling='uniform')
+        current = curve['i'] + rng.normal(0, 0.002 * curve['i_sc'], len(curve['i']))
+        data = [{'Voltage': round(v, 3), 'Current': round(i, 4)} for v, i in zip(curve['v'].tolist(), current.tolist())]
+        body = dash_client.request('my-parameters-table.data', [data])
+        return lambda: dash_client.post(body)
+
+    # A few repeated operating points, as when users tweak the same module
+    repeated = [conditions[k % 10] for k in range(count)]
+    return {
+        'solver (cold)': [solve(*c) for c in conditions],
+        'create_model_IV (cold)': [model_iv(*c) for c in conditions],
+        'create_model_IV (cached)': [model_iv(*c) for c in repeated],
+        'update_my_parameters': [my_parameters(*c) for c in conditions],
+    }
+
+
+def run(calls, clear, warmup=10):
+    for call in calls[:warmup]:
+        call()
+    clear()
+    latencies = np.empty(len(calls))
+    started = time.perf_counter()
+    for k, call in enumerate(calls):
+        t = time.perf_counter()
+        call()
+        latencies[k] = time.perf_counter() - t
+    elapsed = time.perf_counter() - started
+
+    # Peak Python allocations, in a separate pass so tracing does not skew latency
+    clear()
+    tracemalloc.start()
+    for call in calls[:50]:
+        call()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99]) * 1e3
+    return {'requests': len(calls), 'p50_ms': p50, 'p95_ms': p95, 'p99_ms': p99,
+            'throughput': len(calls) / elapsed, 'peak_kib': peak / 1024}
+
+
+def compare(results, baseline, tolerance):
+    # Names of metrics worse than baseline by more than tolerance
+    regressions = []
+    for name, result in results.items():
+        before = baseline.get('scenarios', {}).get(name)
+        if not before:
+            continue
+        for metric in METRICS:
+            ratio = result[metric] / before[metric] if before[metric] else 1
+            worse = ratio < 1 - tolerance if metric == 'throughput' else ratio > 1 + tolerance
+            if worse:
+                regressions.append('%s %s: %.2f -> %.2f' % (name, metric, before[metric], result[metric]))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=300, help='requests per scenario')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--baseline', default=BASELINE)
+    parser.add_argument('--save-baseline', action='store_true', help='record this run as the baseline')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='allowed relative regression')
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    started = time.perf_counter()
+    import app
+    startup = time.perf_counter() - started
+    from ivsolver import curve_cache
+
+    rng = np.random.default_rng(args.seed)
+    results = {}
+    print('%-26s %8s %8s %8s %10s %10s' % ('scenario', 'p50 ms', 'p95 ms', 'p99 ms', 'req/s', 'peak KiB'))
+    with np.errstate(all='ignore'):
+        for name, calls in scenarios(app, app.mod_catalog, args.requests, rng).items():
+            result = results[name] = run(calls, curve_cache.clear)
+            print('%-26s %8.2f %8.2f %8.2f %10.1f %10.0f' % (name, result['p50_ms'], result['p95_ms'],
+                                                            result['p99_ms'], result['throughput'], result['peak_kib']))
+    # ru_maxrss is in KiB on Linux
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print('worker import %.2fs, peak RSS %.0f MiB' % (startup, max_rss / 1024))
+
+    run_info = {
+        'scenarios': results,
+        'requests': args.requests,
+        'seed': args.seed,
+        'python': platform.python_version(),
+        'machine': platform.node(),
+        'recorded': time.strftime('%Y-%m-%d %H:%M:%S'),
+    }
+    status = 0
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.tolerance)
+        print('vs baseline of %s: %s' % (baseline.get('recorded'),
+                                         'no regressions' if not regressions else '%d regressions' % len(regressions)))
+        for line in regressions:
+            print('  ' + line)
+        status = 1 if regressions and not args.save_baseline else 0
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(args.baseline) or '.', exist_ok=True)
+        with open(args.baseline, 'w') as f:
+            json.dump(run_info, f, indent=2)
+        print('saved baseline to %s' % args.baseline)
+    return status
+
+
+if __name__ == '__main__':
+    sys.exit(main())
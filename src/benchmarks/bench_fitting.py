@@ -0,0 +1,78 @@
+"""Single-diode fitting throughput: fits per second, serial and across workers.
+
+    python -m benchmarks.bench_fitting [--traces 200] [--workers 4] [--points 100]
+
+Synthetic traces are made from a random catalog module whose IL, Rs and Rsh
+have drifted differently in every unit, plus measurement noise, so parameter
+recovery is reported too. Fits are warm-started from the catalog values.
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+import pvlib
+
+from catalog import load_catalog
+from fitting import SD_PARAMETERS, fit_files, fit_trace, reference_params
+from ivsolver import solve_curve
+
+
+def synthetic_traces(catalog, count, points, rng, irradiance=900, temperature=45):
+    # One site: a single module type measured at one condition, each unit
+    # with its own drift in IL, Rs and Rsh plus measurement noise
+    while True:
+        index = int(rng.integers(len(catalog)))
+        reference = reference_params(catalog, index, irradiance, temperature)
+        if np.all(np.isfinite(list(reference.values()))):
+            break
+    v_oc = solve_curve(catalog.cec_params(index), irradiance, temperature)['v_oc']
+    voltage = np.linspace(0, 1.02 * v_oc, points)
+    traces = []
+    for _ in range(count):
+        truth = dict(reference, IL=reference['IL'] * rng.uniform(0.9, 1.0),
+                     Rs=reference['Rs'] * rng.uniform(1.0, 2.0), Rsh=reference['Rsh'] * rng.uniform(0.3, 1.0))
+        current = pvlib.pvsystem.i_from_v(
+            resistance_shunt=truth['Rsh'], resistance_series=truth['Rs'], nNsVth=truth['nNsVth'], voltage=voltage,
+            saturation_current=truth['I0'], photocurrent=truth['IL'], method='lambertw')
+        traces.append((voltage, current + rng.normal(0, 0.002 * truth['IL'], points), truth))
+    return catalog.models[index], reference, traces
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--csv', default='module_db.csv')
+    parser.add_argument('--traces', type=int, default=200)
+    parser.add_argument('--points', type=int, default=100, help='points per trace')
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    catalog = load_catalog(args.csv)
+    model, reference, traces = synthetic_traces(catalog, args.traces, args.points, np.random.default_rng(args.seed))
+    print('module %s, %d traces x %d points' % (model, len(traces), args.points))
+
+    errors = []
+    started = time.perf_counter()
+    for voltage, current, truth in traces:
+        fitted = fit_trace(voltage, current, reference)
+        errors.append([fitted[name] / truth[name] - 1 for name in SD_PARAMETERS])
+    serial_seconds = time.perf_counter() - started
+    print('serial: %7.1f fits/s' % (len(traces) / serial_seconds))
+    median = np.median(np.abs(errors), axis=0)
+    print('median |relative error| vs truth: ' + ', '.join('%s %.2f%%' % (name, 100 * e) for name, e in zip(SD_PARAMETERS, median)))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for n, (voltage, current, _) in enumerate(traces):
+            pd.DataFrame({'Voltage': voltage, 'Current': current}).to_csv(os.path.join(tmp, 'trace%05d.csv' % n), index=False)
+        output = os.path.join(tmp, 'fits.out')
+        started = time.perf_counter()
+        fitted = fit_files([tmp], output, reference=reference, workers=args.workers)
+        batch_seconds = time.perf_counter() - started
+    print('batch:  %7.1f fits/s (%d workers, including CSV reads)' % (fitted / batch_seconds, args.workers))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+"""Curve solve/serialization time and fidelity versus point count and sampling.
+
+    python -m benchmarks.bench_sampling [--modules 40] [--points 20 30 50 75 100 150]
+
+Fidelity is the largest gap between the plotted (linearly joined) curve and
+a 2000-point reference, as a percentage of Isc, plus how far the highest
+plotted power falls below the true Pmp.
+"""
+import argparse
+import json
+import time
+
+import numpy as np
+import plotly.graph_objects as go
+import plotly.utils
+
+from catalog import load_catalog
+from ivsolver import solve_curve
+
+REFERENCE_POINTS = 2000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--csv', default='module_db.csv')
+    parser.add_argument('--modules', type=int, default=40, help='random module/condition pairs to average over')
+    parser.add_argument('--points', type=int, nargs='+', default=[20, 30, 50, 75, 100, 150])
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    catalog = load_catalog(args.csv)
+    rng = np.random.default_rng(args.seed)
+    cases = []
+    while len(cases) < args.modules:
+        index = int(rng.integers(len(catalog)))
+        params = catalog.cec_params(index)
+        if not all(np.isfinite(v) for v in params.values()):
+            continue
+        irradiance, temperature = rng.uniform(100, 1200), rng.uniform(-10, 70)
+        reference = solve_curve(params, irradiance, temperature, REFERENCE_POINTS, 'uniform')
+        cases.append((params, irradiance, temperature, reference))
+
+    json.dumps(go.Scatter(x=[0.0], y=[0.0]).to_plotly_json(), cls=plotly.utils.PlotlyJSONEncoder)
+    print('%-9s %6s %10s %10s %8s %11s %11s'
+          % ('sampling', 'points', 'solve ms', 'json ms', 'bytes', 'max dI %Isc', 'Pmp miss %'))
+    for points in args.points:
+        for sampling in ('uniform', 'adaptive'):
+            solve_s = json_s = size = 0
+            curve_error = pmp_error = 0
+            for params, irradiance, temperature, reference in cases:
+                started = time.perf_counter()
+                curve = solve_curve(params, irradiance, temperature, points, sampling)
+                solve_s += time.perf_counter() - started
+
+                started = time.perf_counter()
+                # Serialized the way Dash sends a trace to the browser
+                payload = json.dumps(go.Scatter(x=curve['v'], y=curve['i'], mode='lines').to_plotly_json(),
+                                     cls=plotly.utils.PlotlyJSONEncoder)
+                json_s += time.perf_counter() - started
+                size += len(payload)
+
+                gap = np.abs(np.interp(reference['v'], curve['v'], curve['i']) - reference['i'])
+                curve_error = max(curve_error, gap.max() / reference['i_sc'])
+                pmp_error = max(pmp_error, 1 - (curve['v'] * curve['i']).max() / reference['p_mp'])
+            n = len(cases)
+            print('%-9s %6d %10.2f %10.2f %8d %11.3f %11.3f'
+                  % (sampling, points, 1e3 * solve_s / n, 1e3 * json_s / n, size // n,
+                     100 * curve_error, 100 * pmp_error))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,233 @@
+"""In-memory module catalog built once from module_db.csv.
+
+Lookups by model and manufacturer are exact-match dict lookups instead of
+regex scans over the whole table, and the CEC single-diode parameters are
+kept as contiguous float64 arrays so they can be fed straight into pvlib.
+
+Parsing the CSV is the slowest part of worker startup, so the table is also
+cached as a binary columnar file next to the CSV. Numeric columns live in a
+single memory-mapped .npy (one contiguous row per column), which lets every
+gunicorn worker on a host share the same physical pages. The cache is keyed
+on the CSV's size and mtime and rebuilt automatically when the CSV changes.
+
+Build the cache ahead of time with:
+
+    python catalog.py [module_db.csv]
+"""
+import hashlib
+import json
+import logging
+import os
+import sys
+import time
+
+import numpy as np
+
+from search import PAGE_SIZE, PrefixIndex, page_of
+
+log = logging.getLogger(__name__)
+
+# Columns needed by pvlib.pvsystem.calcparams_cec
+CEC_COLUMNS = ['I_L_ref', 'I_o_ref', 'R_s', 'R_sh_ref', 'a_ref', 'Adjust', 'alpha_sc']
+
+
+class ModuleCatalog:
+
+    def __init__(self, columns):
+        # columns: dict of column name -> 1-D array, all the same length
+        self.columns = columns
+        self.models = list(columns['Model'])
+        self.size = len(self.models)
+
+        # Contiguous float64 copies of the CEC parameters, one array per column
+        self.cec = {col: np.ascontiguousarray(columns[col], dtype=np.float64) for col in CEC_COLUMNS}
+
+        # Model -> row index. Some model names are shared between manufacturers,
+        # so the first row wins for bare model lookups (as the old .iloc[0] did)
+        # and (manufacturer, model) pairs are indexed separately.
+        self._model_index = {}
+        self._pair_index = {}
+        self._manuf_models = {}
+        for i, (manuf, model) in enumerate(zip(columns['Manufacturer'], self.models)):
+            self._model_index.setdefault(model, i)
+            self._pair_index.setdefault((manuf, model), i)
+            self._manuf_models.setdefault(manuf, []).append(model)
+        self.manufacturers = list(self._manuf_models)
+        self._search = None
+
+    def __len__(self):
+        return self.size
+
+    def __contains__(self, model):
+        return model in self._model_index
+
+    def index_of(self, model, manufacturer=None):
+        if manufacturer is not None:
+            return self._pair_index[(manufacturer, model)]
+        return self._model_index[model]
+
+    def models_of(self, manufacturer):
+        return self._manuf_models.get(manufacturer, [])
+
+    def _search_index(self):
+        # Built on the first search, so worker startup does not pay for it
+        if self._search is None:
+            started = time.perf_counter()
+            manufs = self.columns['Manufacturer']
+            rows = {}
+            for (manuf, model), i in self._pair_index.items():
+                rows.setdefault(manuf, []).append(i)
+            self._search = {
+                'models': PrefixIndex(self.models, manufs),
+                'manufacturers': PrefixIndex(self.manufacturers),
+                'rows': {manuf: np.array(sorted(r), dtype=np.intp) for manuf, r in rows.items()},
+            }
+            log.info('Built module search index in %.3fs', time.perf_counter() - started)
+        return self._search
+
+    def search_models(self, query='', manufacturer=None, page=0, size=PAGE_SIZE):
+        """One page of catalog rows whose model or manufacturer matches query.
+
+        Searches within manufacturer's modules when one is given. Returns the
+        row indices and the total number of matches.
+        """
+        index = self._search_index()
+        within = None
+        if manufacturer is not None:
+            within = index['rows'].get(manufacturer, np.empty(0, dtype=np.intp))
+        return page_of(index['models'].search(query, within), page, size)
+
+    def search_manufacturers(self, query='', page=0, size=PAGE_SIZE):
+        # One page of manufacturer names matching query, and the total count
+        matches, total = page_of(self._search_index()['manufacturers'].search(query), page, size)
+        return [self.manufacturers[i] for i in matches], total
+
+    def cec_params(self, index):
+        # CEC single-diode parameters of one catalog row
+        return {col: self.cec[col][index] for col in CEC_COLUMNS}
+
+    def fingerprint(self):
+        # Identifies the module list and CEC parameters, so artifacts derived
+        # from the catalog (e.g. the performance table) can detect staleness.
+        digest = hashlib.sha1('\0'.join(self.models).encode('utf-8'))
+        for col in CEC_COLUMNS:
+            digest.update(self.cec[col].tobytes())
+        return digest.hexdigest()
+
+
+CACHE_DIR = '.module_db_cache'
+
+
+def _cache_paths(csv_path):
+    stat = os.stat(csv_path)
+    cache_dir = os.path.join(os.path.dirname(os.path.abspath(csv_path)), CACHE_DIR)
+    key = '%s-%x-%x' % (os.path.splitext(os.path.basename(csv_path))[0], stat.st_size, stat.st_mtime_ns)
+    return cache_dir, {
+        'numeric': os.path.join(cache_dir, key + '.numeric.npy'),
+        'text': os.path.join(cache_dir, key + '.text.npz'),
+        'meta': os.path.join(cache_dir, key + '.json'),
+    }
+
+
+def build_cache(csv_path):
+    cache_dir, paths = _cache_paths(csv_path)
+    os.makedirs(cache_dir, exist_ok=True)
+    # pandas is only needed to parse the CSV, not to load a fresh cache
+    import pandas as pd
+    frame = pd.read_csv(csv_path)
+
+    numeric = [col for col in frame.columns if frame[col].dtype.kind in 'biuf']
+    text = [col for col in frame.columns if col not in numeric]
+    meta = {
+        'columns': list(frame.columns),
+        'numeric': numeric,
+        'dtypes': {col: frame[col].dtype.str for col in numeric},
+        'text': text,
+        'rows': len(frame),
+    }
+
+    # Write to temporary names and rename into place, metadata last, so a
+    # worker starting up concurrently never sees a half-written cache.
+    suffix = '.%d.tmp' % os.getpid()
+    block = np.ascontiguousarray(frame[numeric].to_numpy(dtype=np.float64).T)
+    with open(paths['numeric'] + suffix, 'wb') as f:
+        np.save(f, block)
+    with open(paths['text'] + suffix, 'wb') as f:
+        # Each text column is stored as one NUL-separated UTF-8 blob, which
+        # decodes far faster than a fixed-width string array.
+        np.savez(f, **{col: np.frombuffer('\0'.join(frame[col].fillna('').astype(str)).encode('utf-8'), dtype=np.uint8)
+                       for col in text})
+    with open(paths['meta'] + suffix, 'w') as f:
+        json.dump(meta, f)
+    for name in ('numeric', 'text', 'meta'):
+        os.replace(paths[name] + suffix, paths[name])
+
+    # Drop caches built from older versions of the CSV
+    keep = {os.path.basename(path) for path in paths.values()}
+    prefix = os.path.splitext(os.path.basename(csv_path))[0] + '-'
+    for name in os.listdir(cache_dir):
+        if name.startswith(prefix) and name not in keep and not name.endswith('.tmp'):
+            try:
+                os.remove(os.path.join(cache_dir, name))
+            except OSError:
+                pass
+    return paths
+
+
+def _read_cache(paths):
+    with open(paths['meta']) as f:
+        meta = json.load(f)
+    block = np.load(paths['numeric'], mmap_mode='r')
+    columns = {}
+    for j, col in enumerate(meta['numeric']):
+        values = block[j]
+        dtype = np.dtype(meta['dtypes'][col])
+        # Float columns stay as views into the shared mapping; the few
+        # integer columns are small enough to copy back to their own dtype.
+        columns[col] = values if dtype == np.float64 else values.astype(dtype)
+    with np.load(paths['text']) as archive:
+        for col in meta['text']:
+            values = archive[col].tobytes().decode('utf-8').split('\0')
+            columns[col] = np.array(values, dtype=object)
+    return {col: columns[col] for col in meta['columns']}
+
+
+def load_catalog(csv_path):
+    started = time.perf_counter()
+    _, paths = _cache_paths(csv_path)
+    source = 'cache'
+    columns = None
+    if os.path.exists(paths['meta']):
+        try:
+            columns = _read_cache(paths)
+        except (OSError, ValueError, KeyError) as e:
+            log.warning('Ignoring unreadable module cache %s: %s', paths['meta'], e)
+    if columns is None:
+        source = 'csv'
+        try:
+            paths = build_cache(csv_path)
+            columns = _read_cache(paths)
+        except OSError as e:
+            # Read-only checkout: fall back to parsing the CSV every time
+            log.warning('Could not write module cache: %s', e)
+            import pandas as pd
+            frame = pd.read_csv(csv_path)
+            columns = {col: frame[col].to_numpy() for col in frame.columns}
+    catalog = ModuleCatalog(columns)
+    catalog.load_seconds = time.perf_counter() - started
+    log.info('Loaded %d modules from %s in %.3fs', len(catalog), source, catalog.load_seconds)
+    return catalog
+
+
+if __name__ == '__main__':
+    import pandas as pd
+    csv_path = sys.argv[1] if len(sys.argv) > 1 else 'module_db.csv'
+    started = time.perf_counter()
+    paths = build_cache(csv_path)
+    print('Built %s in %.3fs' % (paths['numeric'], time.perf_counter() - started))
+    started = time.perf_counter()
+    pd.read_csv(csv_path)
+    print('pd.read_csv: %.3fs' % (time.perf_counter() - started))
+    started = time.perf_counter()
+    load_catalog(csv_path)
+    print('load_catalog (cached): %.3fs' % (time.perf_counter() - started))
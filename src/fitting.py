@@ -0,0 +1,175 @@
+"""Fit the five single-diode parameters to measured IV traces.
+
+fit_trace() solves for (IL, I0, Rs, Rsh, nNsVth) by non-linear least squares
+on the current residuals at every measured voltage, evaluated in one
+vectorized Lambert-W call per iteration. The fit is warm-started from the
+catalog module's CEC parameters at the trace's operating conditions, and
+the result is reported as a deviation from those parameters, which is what
+points at soiling (IL), series resistance growth (Rs) or shunting (Rsh).
+
+Batch mode fits every trace in a set of tracer CSV files (see ingest.py)
+across worker processes:
+
+    python fitting.py fits.csv traces/ --model "LR6-72HV-355M" \\
+        --manufacturer "LONGi Green Energy Technology Co. Ltd." --irradiance 950 --temperature 41
+"""
+import argparse
+import functools
+import sys
+import time
+
+import numpy as np
+
+from ingest import CHUNK_ROWS, extract_parameters, ingest_files, read_traces
+from ivsolver import single_diode_params
+
+SD_PARAMETERS = ('IL', 'I0', 'Rs', 'Rsh', 'nNsVth')
+FIT_COLUMNS = (['file', 'trace', 'points'] + list(SD_PARAMETERS) + ['rmse', 'nfev']
+               + ['d_' + name for name in SD_PARAMETERS] + ['error'])
+
+
+def reference_params(catalog, index, irradiance, temperature, modules=1):
+    """Catalog module's single-diode parameters at the given conditions.
+
+    modules scales them to a string of identical modules in series.
+    """
+    params = catalog.cec_params(index)
+    IL, I0, Rs, Rsh, nNsVth = (float(np.ravel(x)[0]) for x in single_diode_params(params, irradiance, temperature))
+    return {'IL': IL, 'I0': I0, 'Rs': Rs * modules, 'Rsh': Rsh * modules, 'nNsVth': nNsVth * modules}
+
+
+def initial_guess(voltage, current):
+    # Rough start when there is no catalog module to warm-start from
+    key = extract_parameters(voltage, current)
+    nNsVth = 0.05 * key['Voc']
+    return {
+        'IL': key['Isc'],
+        'I0': key['Isc'] * np.exp(-key['Voc'] / nNsVth),
+        'Rs': 0.01 * key['Voc'] / key['Isc'],
+        'Rsh': 100 * key['Voc'] / key['Isc'],
+        'nNsVth': nNsVth,
+    }
+
+
+def _to_x(params):
+    # IL and Rs are fitted directly; I0, Rsh and nNsVth span decades, so in log space
+    return np.array([params['IL'], np.log(params['I0']), params['Rs'], np.log(params['Rsh']), np.log(params['nNsVth'])])
+
+
+def _from_x(x):
+    return {'IL': x[0], 'I0': np.exp(x[1]), 'Rs': x[2], 'Rsh': np.exp(x[3]), 'nNsVth': np.exp(x[4])}
+
+
+def _modeled_current(x, voltage):
+    import pvlib
+    params = _from_x(x)
+    return pvlib.pvsystem.i_from_v(
+        resistance_shunt=params['Rsh'],
+        resistance_series=params['Rs'],
+        nNsVth=params['nNsVth'],
+        voltage=voltage,
+        saturation_current=params['I0'],
+        photocurrent=params['IL'],
+        method='lambertw'
+    )
+
+
+def _residuals(x, voltage, current, scale):
+    return (_modeled_current(x, voltage) - current) / scale
+
+
+def _jacobian(x, voltage, current, scale):
+    # Forward differences for all five parameters in a single broadcast
+    # Lambert-W evaluation, instead of one residual call per parameter
+    step = 1e-7 * np.maximum(np.abs(x), 1)
+    points = np.vstack([x, x + np.diag(step)])[:, :, np.newaxis]
+    modeled = _modeled_current(points.transpose(1, 0, 2), voltage[np.newaxis, :])
+    return ((modeled[1:] - modeled[0]) / scale / step[:, np.newaxis]).T
+
+
+def fit_trace(voltage, current, reference=None):
+    """Least-squares single-diode fit of one measured trace.
+
+    reference holds starting values for SD_PARAMETERS (see reference_params);
+    without it a guess is made from the trace itself. Returns the fitted
+    parameters, the RMS current error in amps, the number of residual
+    evaluations and, with a reference, the relative deviation 'd_<name>'
+    of each fitted parameter from it.
+    """
+    v = np.asarray(voltage, dtype=np.float64)
+    i = np.asarray(current, dtype=np.float64)
+    keep = np.isfinite(v) & np.isfinite(i)
+    v, i = v[keep], i[keep]
+    if len(v) < len(SD_PARAMETERS):
+        raise ValueError('trace needs at least %d points to fit' % len(SD_PARAMETERS))
+
+    from scipy.optimize import least_squares
+    start = reference if reference is not None else initial_guess(v, i)
+    x0 = _to_x(start)
+    lower = [0, -np.inf, 0, -np.inf, -np.inf]
+    x0[2] = max(x0[2], 0)
+    scale = max(np.abs(i).max(), 1e-9)
+    with np.errstate(all='ignore'):
+        solution = least_squares(_residuals, x0, jac=_jacobian, args=(v, i, scale), bounds=(lower, np.inf), x_scale='jac',
+                                 method='trf', max_nfev=200)
+
+    result = _from_x(solution.x)
+    result['rmse'] = float(np.sqrt(np.mean(solution.fun ** 2)) * scale)
+    result['nfev'] = solution.nfev
+    if reference is not None:
+        for name in SD_PARAMETERS:
+            result['d_' + name] = (result[name] - reference[name]) / reference[name]
+    return result
+
+
+def fit_file(path, chunk_rows=CHUNK_ROWS, reference=None):
+    # Runs in a worker process: one fit row per trace in the file
+    rows = []
+    try:
+        for trace_id, voltage, current in read_traces(path, chunk_rows):
+            row = {'file': path, 'trace': trace_id, 'points': len(voltage)}
+            try:
+                row.update(fit_trace(voltage, current, reference))
+            except ValueError as e:
+                row['error'] = str(e)
+            rows.append(row)
+    except (OSError, ValueError) as e:
+        rows.append({'file': path, 'error': str(e)})
+    return rows
+
+
+def fit_files(inputs, output, reference=None, workers=None, chunk_rows=CHUNK_ROWS, relative_to=None, progress=None):
+    """Fit every trace under inputs across worker processes into the CSV output."""
+    return ingest_files(inputs, output, workers, chunk_rows, relative_to=relative_to,
+                        summarize=functools.partial(fit_file, reference=reference), fieldnames=FIT_COLUMNS,
+                        progress=progress)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Fit single-diode parameters to IV trace CSV files.')
+    parser.add_argument('output', help='CSV of fitted parameters to write')
+    parser.add_argument('inputs', nargs='+', help='trace CSV files or directories of them')
+    parser.add_argument('--model', help='catalog module to warm-start from and compare against')
+    parser.add_argument('--manufacturer')
+    parser.add_argument('--irradiance', type=float, default=1000)
+    parser.add_argument('--temperature', type=float, default=25)
+    parser.add_argument('--modules', type=int, default=1, help='modules in series in each trace')
+    parser.add_argument('--workers', type=int, default=None, help='worker processes (default: CPU count)')
+    args = parser.parse_args(argv)
+
+    reference = None
+    if args.model:
+        from catalog import load_catalog
+        catalog = load_catalog('module_db.csv')
+        reference = reference_params(catalog, catalog.index_of(args.model, args.manufacturer),
+                                     args.irradiance, args.temperature, args.modules)
+
+    started = time.perf_counter()
+    written = fit_files(args.inputs, args.output, reference, args.workers)
+    elapsed = time.perf_counter() - started
+    print('Fitted %d traces into %s in %.1fs (%.0f fits/s)'
+          % (written, args.output, elapsed, written / elapsed if elapsed else 0))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,97 @@
+"""Degraded Pmp trajectories of a string over a time series.
+
+A projection takes a module and string length plus either a date range at
+fixed conditions or a weather series of (timestamp, irradiance, cell
+temperature) records, e.g. a year of hourly data. It solves the timestamps
+in vectorized batches and applies the same linear degradation as the
+Degrade panel: V and I each scale by sqrt(1 - rate * years since install),
+so Pmp scales by the degradation factor itself.
+"""
+import io
+
+import numpy as np
+import pandas as pd
+
+from ivsolver import solve_batch
+
+TIMESTAMP_NAMES = ('timestamp', 'time', 'datetime', 'date')
+IRRADIANCE_NAMES = ('irradiance', 'effective_irradiance', 'poa', 'poa_global', 'ghi')
+TEMPERATURE_NAMES = ('temperature', 'temp_cell', 'cell_temperature', 'temp')
+
+PROJECTION_COLUMNS = ['Timestamp', 'Irradiance', 'Temperature', 'Degradation', 'Pmp']
+
+# Records solved per batch: a year of hourly data
+BLOCK_RECORDS = 8760
+
+
+def degradation_factor(timestamps, install_date, rate_percent):
+    # Fraction of initial power left at each timestamp (1 before install)
+    timestamps = pd.DatetimeIndex(timestamps).to_numpy(dtype='datetime64[ns]')
+    days = (timestamps - np.datetime64(pd.Timestamp(install_date))) / np.timedelta64(1, 'D')
+    return np.clip(1 - rate_percent / 100 * np.maximum(days, 0) / 365.25, 0, 1)
+
+
+def _pick(columns, names):
+    lowered = {str(col).strip().lower(): col for col in columns}
+    for name in names:
+        if name in lowered:
+            return lowered[name]
+    raise ValueError('weather data needs one of the columns %s' % ', '.join(names))
+
+
+def read_weather(source):
+    """Weather records from a CSV path or file-like object.
+
+    Returns a frame indexed by timestamp with 'Irradiance' (W/m2) and
+    'Temperature' (cell temperature, C) columns.
+    """
+    raw = pd.read_csv(source)
+    timestamps = pd.to_datetime(raw[_pick(raw.columns, TIMESTAMP_NAMES)])
+    if timestamps.dt.tz is not None:
+        timestamps = timestamps.dt.tz_localize(None)
+    weather = pd.DataFrame({
+        'Irradiance': pd.to_numeric(raw[_pick(raw.columns, IRRADIANCE_NAMES)], errors='coerce').to_numpy(),
+        'Temperature': pd.to_numeric(raw[_pick(raw.columns, TEMPERATURE_NAMES)], errors='coerce').to_numpy(),
+    }, index=pd.DatetimeIndex(timestamps))
+    return weather.sort_index()
+
+
+def constant_weather(start, end, irradiance, temperature, freq='D'):
+    # Fixed operating conditions at every step of a date range
+    index = pd.date_range(start, end, freq=freq)
+    return pd.DataFrame({'Irradiance': float(irradiance), 'Temperature': float(temperature)}, index=index)
+
+
+def project_degradation(catalog, index, weather, mods_per_string, install_date, rate_percent, progress=None):
+    """Degraded string Pmp at every timestamp of weather, in vectorized batches.
+
+    progress(done, total), if given, is called with the records solved after each batch.
+    """
+    irradiance = weather['Irradiance'].to_numpy(dtype=np.float64)
+    temperature = weather['Temperature'].to_numpy(dtype=np.float64)
+
+    # Night-time and missing records produce no power and are not solved
+    pmp = np.zeros(len(weather))
+    lit = np.flatnonzero(np.isfinite(irradiance) & np.isfinite(temperature) & (irradiance > 0))
+    for start in range(0, len(lit), BLOCK_RECORDS):
+        rows = lit[start:start + BLOCK_RECORDS]
+        pmp[rows] = solve_batch(catalog, irradiance[rows], temperature[rows], indices=[index])['p_mp'][0]
+        if progress is not None:
+            progress(start + len(rows), len(lit))
+
+    degradation = degradation_factor(weather.index, install_date, rate_percent)
+    return pd.DataFrame({
+        'Timestamp': weather.index,
+        'Irradiance': irradiance,
+        'Temperature': temperature,
+        'Degradation': degradation,
+        'Pmp': pmp * mods_per_string * degradation,
+    }, columns=PROJECTION_COLUMNS)
+
+
+def iter_csv(projection, rows=5000):
+    # CSV text in blocks of rows, for streaming a large projection
+    for start in range(0, max(len(projection), 1), rows):
+        buffer = io.StringIO()
+        projection.iloc[start:start + rows].to_csv(buffer, index=False, header=start == 0, float_format='%.4f')
+        yield buffer.getvalue()
@@ -0,0 +1,244 @@
+"""Bulk ingestion of measured IV traces from field tracer CSV files.
+
+Each input CSV holds either one trace (a voltage and a current column) or
+many traces in long format, with a 'trace' column identifying rows of the
+same trace (rows of one trace must be contiguous). Files are read in chunks,
+so a file is never fully loaded, and processed in parallel across a process
+pool with a bounded number of files in flight. One summary row per trace is
+appended to the output CSV as results arrive.
+
+    python ingest.py summary.csv traces/ [more.csv ...] [--workers 4]
+"""
+import argparse
+import csv
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+
+import numpy as np
+
+PARAMETER_COLUMNS = ['Pmp', 'Isc', 'Voc', 'Imp', 'Vmp']
+SUMMARY_COLUMNS = ['file', 'trace', 'points'] + PARAMETER_COLUMNS + ['Voc estimated', 'error']
+
+# Furthest Voc is extrapolated past the last measured voltage, as a multiple of it
+VOC_EXTRAPOLATION_LIMIT = 1.5
+
+CHUNK_ROWS = 50000
+
+VOLTAGE_NAMES = ('voltage', 'v', 'volts', 'voltage (v)', 'v (v)')
+CURRENT_NAMES = ('current', 'i', 'amps', 'current (a)', 'i (a)')
+TRACE_NAMES = ('trace', 'trace_id', 'curve', 'curve_id')
+
+
+def extract_parameters(voltage, current):
+    """Pmp, Isc, Voc, Imp and Vmp of a measured trace.
+
+    Isc and Voc are interpolated (or extrapolated from the nearest two
+    points) to V = 0 and I = 0 instead of taking the largest measured
+    values, and the maximum power point is the vertex of a parabola through
+    the highest measured power and its neighbours. A trace that stops short
+    of I = 0 on a flat or rising segment, or too far from it, gets the
+    highest measured voltage as Voc instead, with 'Voc estimated' set.
+    """
+    v = np.asarray(voltage, dtype=np.float64)
+    i = np.asarray(current, dtype=np.float64)
+    keep = np.isfinite(v) & np.isfinite(i)
+    v, i = v[keep], i[keep]
+    if len(v) < 2:
+        raise ValueError('trace needs at least two points')
+    order = np.argsort(v, kind='mergesort')
+    v, i = v[order], i[order]
+
+    if v[0] <= 0 <= v[-1]:
+        isc = np.interp(0, v, i)
+    else:
+        isc = _line_at(v[0], i[0], v[1], i[1], 0)
+
+    below = np.flatnonzero(i <= 0)
+    voc_estimated = False
+    if len(below) and below[0] > 0:
+        k = below[0]
+        voc = _line_at(i[k - 1], v[k - 1], i[k], v[k], 0)
+    else:
+        # Truncated trace: a nearly flat last segment would put Voc far off
+        voc = _line_at(i[-2], v[-2], i[-1], v[-1], 0)
+        falling = v[-1] > v[-2] and i[-1] < i[-2]
+        if not (falling and v[-1] <= voc <= VOC_EXTRAPOLATION_LIMIT * v[-1]):
+            voc, voc_estimated = v[-1], True
+
+    p = v * i
+    k = int(np.argmax(p))
+    vmp = v[k]
+    if 0 < k < len(v) - 1 and v[k - 1] < v[k] < v[k + 1]:
+        a, b, _ = np.polyfit(v[k - 1:k + 2], p[k - 1:k + 2], 2)
+        if a < 0 and v[k - 1] <= -b / (2 * a) <= v[k + 1]:
+            vmp = -b / (2 * a)
+    imp = np.interp(vmp, v, i)
+
+    return {'Pmp': vmp * imp, 'Isc': isc, 'Voc': voc, 'Imp': imp, 'Vmp': vmp, 'Voc estimated': voc_estimated}
+
+
+def _line_at(x0, y0, x1, y1, x):
+    # y at x on the line through (x0, y0) and (x1, y1); y1 if it is vertical
+    if x1 == x0:
+        return y1
+    return y0 + (y1 - y0) * (x - x0) / (x1 - x0)
+
+
+def _find_column(columns, names, prefix):
+    lowered = {str(col).strip().lower(): col for col in columns}
+    for name in names:
+        if name in lowered:
+            return lowered[name]
+    for name, col in lowered.items():
+        if prefix and name.startswith(prefix):
+            return col
+    return None
+
+
+def read_traces(path, chunk_rows=CHUNK_ROWS):
+    """Yield (trace_id, voltage, current) for every trace in a CSV file."""
+    import pandas as pd
+    v_col = i_col = trace_col = None
+    pending_id, pending_v, pending_i = None, [], []
+    for chunk in pd.read_csv(path, chunksize=chunk_rows):
+        if v_col is None:
+            v_col = _find_column(chunk.columns, VOLTAGE_NAMES, 'volt')
+            i_col = _find_column(chunk.columns, CURRENT_NAMES, 'curr')
+            trace_col = _find_column(chunk.columns, TRACE_NAMES, None)
+            if v_col is None or i_col is None:
+                raise ValueError('no voltage/current columns in %s' % list(chunk.columns))
+        voltage = pd.to_numeric(chunk[v_col], errors='coerce').to_numpy()
+        current = pd.to_numeric(chunk[i_col], errors='coerce').to_numpy()
+        if trace_col is None:
+            pending_v.append(voltage)
+            pending_i.append(current)
+            continue
+
+        # Long format: split the chunk where the trace id changes. The last
+        # trace may continue in the next chunk, so it is carried over.
+        ids = chunk[trace_col].to_numpy()
+        starts = np.flatnonzero(ids[1:] != ids[:-1]) + 1
+        bounds = [0] + list(starts) + [len(ids)]
+        for start, stop in zip(bounds[:-1], bounds[1:]):
+            if pending_id is not None and ids[start] != pending_id:
+                yield pending_id, np.concatenate(pending_v), np.concatenate(pending_i)
+                pending_v, pending_i = [], []
+            pending_id = ids[start]
+            pending_v.append(voltage[start:stop])
+            pending_i.append(current[start:stop])
+    if pending_v:
+        trace_id = pending_id if trace_col is not None else ''
+        yield trace_id, np.concatenate(pending_v), np.concatenate(pending_i)
+
+
+def summarize_file(path, chunk_rows=CHUNK_ROWS):
+    # Runs in a worker process: one summary row per trace in the file
+    import pandas as pd
+    rows = []
+    try:
+        for trace_id, voltage, current in read_traces(path, chunk_rows):
+            row = {'file': path, 'trace': trace_id, 'points': len(voltage)}
+            try:
+                params = extract_parameters(voltage, current)
+                row.update({name: round(float(params[name]), 4) for name in PARAMETER_COLUMNS})
+                row['Voc estimated'] = params['Voc estimated']
+            except ValueError as e:
+                row['error'] = str(e)
+            rows.append(row)
+    except (OSError, ValueError, pd.errors.ParserError) as e:
+        rows.append({'file': path, 'error': str(e)})
+    return rows
+
+
+def iter_csv_paths(inputs):
+    for path in inputs:
+        if os.path.isdir(path):
+            for root, dirs, files in os.walk(path):
+                dirs.sort()
+                for name in sorted(files):
+                    if name.lower().endswith('.csv'):
+                        yield os.path.join(root, name)
+        else:
+            yield path
+
+
+class InlineExecutor:
+    """Runs each submitted call at once in this process, for workers=1."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def submit(self, func, *args):
+        future = Future()
+        try:
+            future.set_result(func(*args))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+
+def ingest_files(inputs, output, workers=None, chunk_rows=CHUNK_ROWS, max_pending=None, relative_to=None,
+                 summarize=summarize_file, fieldnames=SUMMARY_COLUMNS, progress=None):
+    """Summarize every trace under inputs into the CSV file output.
+
+    At most max_pending files (default: twice the worker count) are queued
+    at once, so memory stays bounded however many files there are. File
+    names are written relative to relative_to when given. summarize(path,
+    chunk_rows) runs in the workers and returns the rows for one file.
+    progress(done, total), if given, is called with the files done after each
+    one. With workers=1 files are processed in this process, without a
+    pool. Returns the number of traces written.
+    """
+    workers = workers or os.cpu_count() or 1
+    max_pending = max_pending or 2 * workers
+    total = sum(1 for _ in iter_csv_paths(inputs)) if progress is not None else None
+    written = files = 0
+    executor = ProcessPoolExecutor(max_workers=workers) if workers > 1 else InlineExecutor()
+    with open(output, 'w', newline='') as f, executor as pool:
+        writer = csv.DictWriter(f, fieldnames=fieldnames)
+        writer.writeheader()
+        pending = set()
+        paths = iter_csv_paths(inputs)
+        while True:
+            for path in paths:
+                pending.add(pool.submit(summarize, path, chunk_rows))
+                if len(pending) >= max_pending:
+                    break
+            if not pending:
+                break
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                rows = future.result()
+                if relative_to:
+                    for row in rows:
+                        row['file'] = os.path.relpath(row['file'], relative_to)
+                writer.writerows(rows)
+                written += len(rows)
+                files += 1
+                if progress is not None:
+                    progress(files, total)
+    return written
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Extract Pmp/Isc/Voc/Imp/Vmp from IV trace CSV files.')
+    parser.add_argument('output', help='summary CSV to write')
+    parser.add_argument('inputs', nargs='+', help='trace CSV files or directories of them')
+    parser.add_argument('--workers', type=int, default=None, help='worker processes (default: CPU count)')
+    parser.add_argument('--chunk-rows', type=int, default=CHUNK_ROWS, help='CSV rows read at a time')
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+    written = ingest_files(args.inputs, args.output, args.workers, args.chunk_rows)
+    elapsed = time.perf_counter() - started
+    print('Wrote %d traces to %s in %.1fs (%.0f traces/s)'
+          % (written, args.output, elapsed, written / elapsed if elapsed else 0))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,334 @@
+"""Single-diode IV curve solves for catalog modules, with an LRU result cache.
+
+Only the module and its operating conditions (irradiance, cell temperature)
+affect the solved curve. String length, degradation and plotting are applied
+afterwards by the caller, so those inputs can change without re-solving.
+
+The cache is bounded and its float keys are quantized. Quantization defaults
+to the 0.01 step of the app's input boxes, so cached results are identical
+to a fresh solve; widen it to trade a little precision for more hits:
+
+    IV_CACHE_SIZE=512 IV_CACHE_IRRADIANCE_STEP=1 IV_CACHE_TEMPERATURE_STEP=0.1
+
+Curves default to 75 adaptively spaced points, which plot as closely to the
+true curve as 150 uniform points (see benchmarks/bench_sampling.py). Set
+IV_CURVE_POINTS / IV_CURVE_SAMPLING=uniform to change that, or pass points and
+sampling explicitly for a dense export.
+
+Cache misses are first looked up in the precomputed performance table (see
+perftable.py); only off-grid points are solved, unless IV_TABLE_INTERPOLATE=1
+lets them be interpolated from the table instead. With IV_SHARED_CACHE set,
+misses first check a store shared by all workers (see sharedcache.py).
+
+pvlib (and the scipy it pulls in) is imported on the first solve rather than
+with this module, so a web worker starts serving pages before it is needed.
+"""
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from metrics import span
+
+# Band gap parameters used by the app for every module
+EGREF = 1.121
+DEGDT = -0.0002677
+
+# Default curve budget for the web view. 'uniform' spaces points evenly from 0
+# to Voc; 'adaptive' concentrates them around the maximum power point knee and
+# near Voc, so 75 adaptive points track the curve as closely as 150 uniform ones.
+CURVE_POINTS = int(os.environ.get('IV_CURVE_POINTS', 75))
+CURVE_SAMPLING = os.environ.get('IV_CURVE_SAMPLING', 'adaptive')
+
+KEY_PARAMETERS = ('p_mp', 'i_sc', 'v_oc', 'i_mp', 'v_mp')
+
+
+def _readonly(values):
+    values = np.ascontiguousarray(values, dtype=np.float64)
+    values.setflags(write=False)
+    return values
+
+
+def sample_voltages(v_mp, v_oc, points, sampling='uniform'):
+    """Voltages 0..Voc at which to evaluate a curve of the given point budget.
+
+    Adaptive sampling draws points from a density with a sparse floor on the
+    flat current plateau, a peak at the knee around Vmp and a smaller peak
+    approaching Voc, and always includes Vmp itself.
+    """
+    if sampling == 'uniform' or not (np.isfinite(v_mp) and np.isfinite(v_oc) and 0 < v_mp < v_oc) or points < 4:
+        return np.linspace(0, v_oc, points)
+    if sampling != 'adaptive':
+        raise ValueError('unknown curve sampling %r' % sampling)
+    knee = v_mp / v_oc
+    u = np.linspace(0, 1, 1025)
+    density = 0.15 + np.exp(-((u - knee) / 0.1) ** 2) + 0.4 * np.exp(-((u - 1) / 0.06) ** 2)
+    cdf = np.concatenate([[0], np.cumsum((density[1:] + density[:-1]) / 2)])
+    u = np.interp(np.linspace(0, cdf[-1], points), cdf, u)
+    # Put one sample exactly on the maximum power point
+    nearest = 1 + np.argmin(np.abs(u[1:-1] - knee))
+    u[nearest] = knee
+    return u * v_oc
+
+
+def single_diode_params(params, irradiance, temperature):
+    # (IL, I0, Rs, Rsh, nNsVth) at the operating point, from the module's CEC
+    # parameters as returned by ModuleCatalog.cec_params
+    import pvlib
+    with span('calcparams_cec'):
+        return pvlib.pvsystem.calcparams_cec(
+            effective_irradiance=irradiance,
+            temp_cell=temperature,
+            EgRef=EGREF,
+            dEgdT=DEGDT,
+            **params
+        )
+
+
+def _curve(sd_params, key_values, points, sampling):
+    import pvlib
+    IL, I0, Rs, Rsh, nNsVth = sd_params
+    voltage = sample_voltages(key_values['v_mp'], key_values['v_oc'], points, sampling)
+    with span('i_from_v'):
+        current = pvlib.pvsystem.i_from_v(
+            resistance_shunt=Rsh,
+            resistance_series=Rs,
+            nNsVth=nNsVth,
+            voltage=voltage,
+            saturation_current=I0,
+            photocurrent=IL,
+            method='lambertw'
+        )
+    curve = {'v': _readonly(voltage), 'i': _readonly(current)}
+    for name in KEY_PARAMETERS:
+        curve[name] = float(key_values[name])
+    return curve
+
+
+def solve_curve(params, irradiance, temperature, points=CURVE_POINTS, sampling=CURVE_SAMPLING):
+    import pvlib
+    sd_params = single_diode_params(params, irradiance, temperature)
+    IL, I0, Rs, Rsh, nNsVth = sd_params
+    # Key parameters only; the curve itself is one explicit i(V) evaluation,
+    # which for uniform sampling is exactly what singlediode's ivcurve_pnts does
+    with span('singlediode'):
+        curve_info = pvlib.pvsystem.singlediode(
+            photocurrent=np.ravel(IL),
+            saturation_current=np.ravel(I0),
+            resistance_series=Rs,
+            resistance_shunt=np.ravel(Rsh),
+            nNsVth=np.ravel(nNsVth),
+            method='lambertw'
+        )
+    key_values = {name: np.ravel(curve_info[name])[0] for name in KEY_PARAMETERS}
+    return _curve(sd_params, key_values, points, sampling)
+
+
+def expand_curve(params, irradiance, temperature, key_values, points=CURVE_POINTS, sampling=CURVE_SAMPLING):
+    """Curve for an operating point whose key parameters are already known.
+
+    singlediode spends most of its time locating the maximum power point.
+    With Vmp and Voc known (e.g. from the precomputed performance table) the
+    curve is a single explicit i(V) evaluation.
+    """
+    return _curve(single_diode_params(params, irradiance, temperature), key_values, points, sampling)
+
+
+def solve_batch(catalog, irradiance, temperature, indices=None, points=None, chunk_size=4096, progress=None):
+    """Solve N catalog modules at M operating conditions in one vectorized pass.
+
+    irradiance and temperature are broadcast against each other to give the
+    M conditions shared by every module, or to (N, M) for per-module
+    conditions (e.g. each module's own NOCT). indices selects catalog rows
+    (all modules by default). Returns the key parameters as (N, M) arrays,
+    plus 'v' and 'i' curves of shape (N, M, points) when points is given.
+    At most chunk_size curves (modules x conditions) are solved at a time to
+    bound peak memory: whole modules while they fit, otherwise one module's
+    conditions in slices. progress(done, total) is called with the modules
+    solved after each one or more modules.
+    """
+    import pvlib
+    if indices is None:
+        indices = np.arange(len(catalog))
+    indices = np.asarray(indices, dtype=np.intp)
+    irradiance, temperature = np.broadcast_arrays(
+        np.atleast_1d(np.asarray(irradiance, dtype=np.float64)),
+        np.atleast_1d(np.asarray(temperature, dtype=np.float64)))
+    if irradiance.ndim == 1:
+        irradiance = irradiance[np.newaxis, :]
+        temperature = temperature[np.newaxis, :]
+    elif irradiance.shape[0] != len(indices):
+        raise ValueError('per-module conditions must have one row per module')
+    per_module = irradiance.shape[0] > 1
+    n, m = len(indices), irradiance.shape[1]
+
+    result = {name: np.empty((n, m)) for name in KEY_PARAMETERS}
+    if points:
+        result['v'] = np.empty((n, m, points))
+        result['i'] = np.empty((n, m, points))
+
+    rows_per_chunk = max(1, chunk_size // max(m, 1))
+    columns_per_chunk = max(1, min(m, chunk_size))
+    for start in range(0, n, rows_per_chunk):
+        rows = indices[start:start + rows_per_chunk]
+        stop = start + len(rows)
+        params = {col: values[rows][:, np.newaxis] for col, values in catalog.cec.items()}
+        for first in range(0, m, columns_per_chunk):
+            last = min(first + columns_per_chunk, m)
+            conditions = (slice(start, stop) if per_module else slice(None), slice(first, last))
+            sd_params = pvlib.pvsystem.calcparams_cec(
+                effective_irradiance=irradiance[conditions],
+                temp_cell=temperature[conditions],
+                EgRef=EGREF,
+                dEgdT=DEGDT,
+                **params
+            )
+            IL, I0, Rs, Rsh, nNsVth = (np.ravel(x) for x in np.broadcast_arrays(*sd_params))
+            # Rows with missing CEC parameters come back as NaN rather than raising
+            with np.errstate(invalid='ignore', divide='ignore', over='ignore'):
+                curve_info = pvlib.pvsystem.singlediode(
+                    photocurrent=IL,
+                    saturation_current=I0,
+                    resistance_series=Rs,
+                    resistance_shunt=Rsh,
+                    nNsVth=nNsVth,
+                    ivcurve_pnts=points,
+                    method='lambertw'
+                )
+            shape = (len(rows), last - first)
+            for name in KEY_PARAMETERS:
+                result[name][start:stop, first:last] = np.reshape(curve_info[name], shape)
+            if points:
+                result['v'][start:stop, first:last] = np.reshape(curve_info['v'], shape + (points,))
+                result['i'][start:stop, first:last] = np.reshape(curve_info['i'], shape + (points,))
+        if progress is not None:
+            progress(stop, n)
+    return result
+
+
+def quantize(value, step):
+    if not step:
+        return float(value)
+    return round(round(float(value) / step) * step, 10)
+
+
+class CurveCache:
+
+    def __init__(self, maxsize=256, irradiance_step=0.01, temperature_step=0.01, interpolate=False):
+        self.maxsize = maxsize
+        self.irradiance_step = irradiance_step
+        self.temperature_step = temperature_step
+        # Optional perftable.PerformanceTable consulted before solving, and
+        # whether off-grid points may be answered by interpolating it
+        self.table = None
+        self.interpolate = interpolate
+        # Optional sharedcache.SharedCurveStore, shared by all workers and
+        # consulted before the table and the solver
+        self.store = None
+        self.shared_hits = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.table_hits = 0
+        self.interpolated = 0
+        self._curves = OrderedDict()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            maxsize=int(os.environ.get('IV_CACHE_SIZE', 256)),
+            irradiance_step=float(os.environ.get('IV_CACHE_IRRADIANCE_STEP', 0.01)),
+            temperature_step=float(os.environ.get('IV_CACHE_TEMPERATURE_STEP', 0.01)),
+            interpolate=os.environ.get('IV_TABLE_INTERPOLATE', '0') == '1',
+        )
+
+    def __len__(self):
+        return len(self._curves)
+
+    def get_curve(self, catalog, index, irradiance, temperature, points=CURVE_POINTS, sampling=CURVE_SAMPLING):
+        # index: catalog row, so modules sharing a model name never collide.
+        # Exports can ask for a denser curve than the web view's default budget.
+        irradiance = quantize(irradiance, self.irradiance_step)
+        temperature = quantize(temperature, self.temperature_step)
+        key = (index, irradiance, temperature, points, sampling)
+        with self._lock:
+            curve = self._curves.get(key)
+            if curve is not None:
+                self._curves.move_to_end(key)
+                self.hits += 1
+                return curve
+            self.misses += 1
+
+        # Interpolated and solved curves differ slightly, so they are shared separately
+        shared_key = key + (self.interpolate,)
+        if self.store is not None:
+            with span('shared_cache_get'):
+                curve = self.store.get(shared_key)
+            if curve is not None:
+                with self._lock:
+                    self.shared_hits += 1
+                    self._remember(key, curve)
+                return curve
+
+        params = catalog.cec_params(index)
+        key_values = None
+        if self.table is not None:
+            with span('table_lookup'):
+                key_values = self.table.lookup(index, irradiance, temperature)
+                if key_values is None and self.interpolate:
+                    key_values = self.table.interpolate(index, irradiance, temperature)
+        if key_values is None:
+            curve = solve_curve(params, irradiance, temperature, points, sampling)
+        else:
+            curve = expand_curve(params, irradiance, temperature, key_values, points, sampling)
+            if 'error_bound' in key_values:
+                curve['error_bound'] = key_values['error_bound']
+
+        with self._lock:
+            if key_values is not None:
+                if 'error_bound' in key_values:
+                    self.interpolated += 1
+                else:
+                    self.table_hits += 1
+            self._remember(key, curve)
+        if self.store is not None:
+            with span('shared_cache_set'):
+                self.store.set(shared_key, curve)
+        return curve
+
+    def _remember(self, key, curve):
+        # Caller holds the lock
+        self._curves[key] = curve
+        self._curves.move_to_end(key)
+        while len(self._curves) > self.maxsize:
+            self._curves.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._curves.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._curves),
+                'maxsize': self.maxsize,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'table_hits': self.table_hits,
+                'interpolated': self.interpolated,
+                'shared_hits': self.shared_hits,
+                'hit_ratio': self.hits / lookups if lookups else 0.0,
+                'irradiance_step': self.irradiance_step,
+                'temperature_step': self.temperature_step,
+                'interpolate': self.interpolate,
+                # Relative error bounds of interpolated answers, across all modules
+                'interpolation_error_bound': self.table.error_summary() if self.interpolate and self.table is not None else None,
+            }
+
+
+curve_cache = CurveCache.from_env()
@@ -0,0 +1,256 @@
+"""Long-running analyses in a process pool, off the request thread.
+
+Batch solves, fleet projections and bulk imports used to run inside the
+request, tying up a gunicorn sync worker until they finished or timed out.
+Jobs are submitted to a JobQueue instead, which runs them in a pool of
+processes forked from the web worker (so they start with the catalog already
+loaded) and returns a job ID at once. State, progress and results are kept
+in a diskcache directory shared by every worker on the host, so any worker
+can answer for any job:
+
+    job_id = job_queue.submit('fleet', fleet_job, args)
+    job_queue.status(job_id)   # {'state': 'running', 'progress': [3, 8], ...}
+    job_queue.result(job_id)
+
+A job function is called as func(progress, *args); progress(done, total)
+records how far it is and is where a cancelled job stops. BackgroundManager
+runs Dash background callbacks (background=True) on the same queue, so
+their outputs also stay retrievable by job ID after the page has read them.
+
+    JOB_DIR=/var/tmp/ivcurves-jobs   where job state and results are kept
+    JOB_WORKERS=2                    pool processes per web worker
+    JOB_TTL=86400                    seconds a job and its result are kept
+"""
+import logging
+import multiprocessing
+import os
+import shutil
+import tempfile
+import time
+import traceback
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import diskcache
+from dash import DiskcacheManager
+from dash.exceptions import PreventUpdate
+
+log = logging.getLogger(__name__)
+
+JOB_DIR = os.path.join(tempfile.gettempdir(), 'ivcurves-jobs')
+WORKERS = 2
+TTL = 24 * 3600
+
+# A job is 'queued' or 'running' until it reaches one of these
+FINISHED = ('done', 'failed', 'cancelled')
+
+MISSING = object()
+
+
+class JobCancelled(Exception):
+    pass
+
+
+def _key(job_id, part=''):
+    return 'job:%s%s' % (job_id, part)
+
+
+def _update(cache, job_id, ttl, **changes):
+    with cache.transact():
+        record = cache.get(_key(job_id))
+        if record is not None:
+            record.update(changes)
+            cache.set(_key(job_id), record, expire=ttl)
+    return record
+
+
+class Progress:
+    """First argument of every job function."""
+
+    def __init__(self, cache, job_id, ttl):
+        self.cache = cache
+        self.job_id = job_id
+        self.ttl = ttl
+
+    def __call__(self, *value):
+        if self.cache.get(_key(self.job_id, ':cancel')):
+            raise JobCancelled(self.job_id)
+        _update(self.cache, self.job_id, self.ttl, progress=list(value))
+
+
+# Cache handles of this process by directory; handles are not shared across a fork
+_caches = {}
+
+
+def _open(directory):
+    cache = _caches.get((os.getpid(), directory))
+    if cache is None:
+        cache = _caches[os.getpid(), directory] = diskcache.Cache(directory)
+    return cache
+
+
+def _execute(directory, ttl, job_id, func, args):
+    # Runs in a pool process
+    cache = _open(directory)
+    if cache.get(_key(job_id, ':cancel')):
+        _update(cache, job_id, ttl, state='cancelled', finished=time.time())
+        return
+    started = time.time()
+    _update(cache, job_id, ttl, state='running', started=started, pid=os.getpid())
+    try:
+        result = func(Progress(cache, job_id, ttl), *args)
+    except JobCancelled:
+        _update(cache, job_id, ttl, state='cancelled', finished=time.time())
+    except Exception as e:
+        log.exception('Job %s failed', job_id)
+        _update(cache, job_id, ttl, state='failed', error=str(e), finished=time.time())
+    else:
+        cache.set(_key(job_id, ':result'), result, expire=ttl)
+        finished = time.time()
+        _update(cache, job_id, ttl, state='done', finished=finished, seconds=finished - started)
+
+
+class JobQueue:
+    """Runs job functions in a process pool and tracks them by job ID."""
+
+    def __init__(self, directory=JOB_DIR, workers=WORKERS, ttl=TTL):
+        self.directory = directory
+        self.workers = workers
+        self.ttl = ttl
+        self.cache = diskcache.Cache(directory)
+        self._pool = None
+        self._pid = None
+        self._futures = {}
+
+    def _executor(self):
+        # One pool per web worker, started with its first job: a pool must not cross a fork
+        if self._pid != os.getpid():
+            self._pool = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context('fork'))
+            self._pid = os.getpid()
+            self._futures = {}
+        return self._pool
+
+    def submit(self, kind, func, *args, cleanup=()):
+        """Queue func(progress, *args) and return its job ID.
+
+        func and args are pickled to the pool, so func must be a module-level
+        function. Directories in cleanup are removed once the job has ended,
+        including when it is cancelled before it starts.
+        """
+        job_id = uuid.uuid4().hex
+        self.cache.set(_key(job_id), {'id': job_id, 'kind': kind, 'state': 'queued', 'progress': None,
+                                      'submitted': time.time()}, expire=self.ttl)
+        try:
+            future = self._executor().submit(_execute, self.directory, self.ttl, job_id, func, args)
+        except BrokenProcessPool:
+            # A pool process died (e.g. killed for memory); start a new pool
+            self._pid = None
+            future = self._executor().submit(_execute, self.directory, self.ttl, job_id, func, args)
+        self._futures[job_id] = future
+        future.add_done_callback(lambda done: self._finished(job_id, done, cleanup))
+        return job_id
+
+    def _finished(self, job_id, future, cleanup=()):
+        self._futures.pop(job_id, None)
+        for path in cleanup:
+            shutil.rmtree(path, ignore_errors=True)
+        if not future.cancelled() and future.exception() is not None:
+            _update(self.cache, job_id, self.ttl, state='failed', error=str(future.exception()), finished=time.time())
+
+    def status(self, job_id):
+        return self.cache.get(_key(job_id))
+
+    def result(self, job_id):
+        """Return value of a finished job, or MISSING."""
+        return self.cache.get(_key(job_id, ':result'), MISSING)
+
+    def cancel(self, job_id):
+        """Cancel a queued or running job; running jobs stop at their next progress call."""
+        record = self.status(job_id)
+        if record is None or record['state'] in FINISHED:
+            return record
+        future = self._futures.get(job_id)
+        if future is not None and future.cancel():
+            return _update(self.cache, job_id, self.ttl, state='cancelled', finished=time.time())
+        # Running, or queued by another web worker
+        self.cache.set(_key(job_id, ':cancel'), True, expire=self.ttl)
+        return record
+
+
+def from_env():
+    return JobQueue(os.environ.get('JOB_DIR', JOB_DIR), int(os.environ.get('JOB_WORKERS', WORKERS)),
+                    float(os.environ.get('JOB_TTL', TTL)))
+
+
+# Dash background callbacks by their registry key, as (function, takes progress)
+_callbacks = {}
+
+
+def _run_callback(progress, callback_key, result_key, progress_key, context, args):
+    # Job function of a background callback: runs it the way DiskcacheManager's
+    # subprocesses do, and leaves its output where Dash polls for it
+    from dash._callback_context import context_value
+    from dash._utils import AttributeDict
+
+    fn, takes_progress = _callbacks[callback_key]
+    cache = progress.cache
+
+    def set_progress(value):
+        value = list(value) if isinstance(value, (list, tuple)) else [value]
+        progress(*value)
+        cache.set(progress_key, value, expire=progress.ttl)
+
+    context = AttributeDict(**context)
+    context.ignore_register_page = False
+    context_value.set(context)
+    leading = [set_progress] if takes_progress else []
+    try:
+        if isinstance(args, dict):
+            output = fn(*leading, **args)
+        else:
+            output = fn(*leading, *args)
+    except PreventUpdate:
+        cache.set(result_key, {'_dash_no_update': '_dash_no_update'}, expire=progress.ttl)
+        return None
+    except JobCancelled:
+        raise
+    except Exception as e:
+        cache.set(result_key, {'long_callback_error': {'msg': str(e), 'tb': traceback.format_exc()}},
+                  expire=progress.ttl)
+        raise
+    cache.set(result_key, output, expire=progress.ttl)
+    return output
+
+
+class BackgroundManager(DiskcacheManager):
+    """Dash background callback manager that runs callbacks as JobQueue jobs.
+
+    Dash's DiskcacheManager starts a new process for every call; here calls
+    share the queue's pool, and the job ID Dash polls with is the queue's.
+    """
+
+    def __init__(self, queue):
+        self.queue = queue
+        super().__init__(queue.cache, expire=queue.ttl)
+
+    def make_job_fn(self, fn, progress, key=None):
+        _callbacks[key] = (fn, progress)
+        return key
+
+    def call_job_fn(self, key, job_fn, args, context):
+        fn = _callbacks[job_fn][0]
+        return self.queue.submit('callback:' + fn.__name__, _run_callback, job_fn, key, self._make_progress_key(key),
+                                 dict(context), args)
+
+    def job_running(self, job):
+        record = self.queue.status(job) if job else None
+        return record is not None and record['state'] not in FINISHED
+
+    def terminate_job(self, job):
+        # Also called by Dash once it has read a result, when it is a no-op
+        if job:
+            self.queue.cancel(job)
+
+    def terminate_unhealthy_job(self, job):
+        return False
@@ -0,0 +1,394 @@
+"""Page layouts, built on first request by factory functions and cached.
+
+Building the pages at import time made every worker pay for them before it
+could accept traffic, including pages nobody had asked for yet.
+"""
+import functools
+from datetime import date
+
+import dash_bootstrap_components as dbc
+import plotly.graph_objects as go
+from dash import dash_table, dcc, html
+from plotly.subplots import make_subplots
+
+from ranking import RANK_COLUMNS
+from search import search_text
+
+DEFAULT_MANUFACTURER = 'LONGi Green Energy Technology Co. Ltd.'
+
+
+def iv_figure():
+    """Empty IV graph with every trace the callbacks fill in.
+
+    Traces, in order: modeled IV, Pmp point, power curve, imported data.
+    The traces always exist and overlays are shown or hidden, so the
+    clientside callback in assets/scaling.js only swaps trace data and
+    visibility.
+    """
+    fig = make_subplots(specs=[[{"secondary_y": True}]])
+    fig.add_trace(go.Scatter(x=[], y=[], name="Modeled IV", mode="lines", line_color="#78c2ad", showlegend=False))
+    fig.add_trace(go.Scatter(x=[], y=[], name="Pmp", line_color="#007bff", showlegend=False, visible=False),
+                  secondary_y=False)
+    fig.add_trace(go.Scatter(x=[], y=[], name="Modeled Power", mode="lines", line_color="#f3969a", showlegend=False,
+                             visible=False), secondary_y=True)
+    fig.add_trace(go.Scatter(x=[], y=[], name="Your module", mode="lines", line_color="#ffce67", showlegend=False),
+                  secondary_y=False)
+    fig.update_xaxes(title_text="Voltage (V)")
+    fig.update_yaxes(title_text="Current (A)", secondary_y=False)
+    fig.update_yaxes(title_text="Power (W)", secondary_y=True, visible=False)
+    fig.update_layout(hovermode="closest")
+    return fig
+
+
+# Define your app's "FAQ" page layout
+@functools.lru_cache(maxsize=None)
+def faq_page():
+    return dbc.Container([
+        dbc.Row([
+            dbc.Col([
+                dcc.Markdown("# FAQ")
+            ], width=True),
+        ], align="end"),
+        html.Hr(),
+        dbc.Row([
+            html.H5("What is an IV Curve?"),
+            html.H6("A solar PV (Photovoltaic) IV curve, also known as an I-V curve, is a graphical representation of the electrical characteristics of a photovoltaic module or solar panel. It illustrates the relationship between the current (I) generated by the solar panel and the voltage (V) across its terminals under varying conditions, such as different levels of sunlight and temperature. Analyzing a solar PV IV curve helps assess the module's efficiency, performance, and its ability to generate electricity under different environmental conditions, making it a crucial tool for evaluating and optimizing solar energy systems."),
+            html.Hr(),
+            html.H5("How is a Solar IV Curve Measured?"),
+            html.H6("Solar IV curves are typically measured using a specialized piece of equipment called an IV curve tracer. This device applies different voltage levels to the solar panel and records the resulting current."),
+            html.Hr(),
+            html.H5("What Do the Key Parameters of an IV Curve Mean?"),
+            html.H6("Key parameters include Voc (Open-Circuit Voltage), Isc (Short-Circuit Current), and Pmp (Maximum Power Point, or Pmax). Voc is the maximum voltage with no current, Isc is the maximum current with no voltage, and Pmp is the point of maximum power output."),
+            html.Hr(),
+            html.H5("What Is the Significance of the Open-Circuit Voltage (Voc)?"),
+            html.H6("Voc represents the voltage across the solar panel when there is no current flow. It is an essential parameter as it indicates the maximum potential voltage that the solar panel can generate in open-circuit conditions under specific lighting and temperature conditions."),
+            html.Hr(),
+            html.H5("What Is the Significance of the Short-Circuit Current (Isc)?"),
+            html.H6("Isc represents the maximum current that the solar panel can generate when its terminals are short-circuited. This parameter is crucial for assessing the panel's ability to provide high current under specific lighting and temperature conditions."),
+            html.Hr(),
+            html.H5("What Is the Maximum Power Point (Pmax)?"),
+            html.H6("Pmax is the point on the IV curve where the solar panel generates the highest power output. It is the operating point at which the solar panel is most efficient in converting sunlight into electricity."),
+            html.Hr(),
+            html.H5("What Factors Affect the Shape of an IV Curve?"),
+            html.H6("The shape of an IV curve is influenced by factors such as irradiance (intensity of sunlight), temperature, shading, and degradation of the solar panel. Changes in these factors can alter the curve's shape and parameters."),
+            html.Hr(),
+            html.H5("How Does Temperature Affect the IV Curve?"),
+            html.H6("Temperature affects the IV curve by shifting the curve and changing the values of key parameters. Higher temperatures tend to reduce the open-circuit voltage (Voc) and increase the short-circuit current (Isc), impacting the panel's overall performance."),
+            html.Hr(),
+            html.H5("What Are the Different Operating Points on an IV Curve?"),
+            html.H6("An IV curve has various operating points, including open-circuit voltage (Voc), short-circuit current (Isc), and the maximum power point (Pmax). Understanding these points helps in optimizing the performance of a solar panel."),
+            html.Hr(),
+            html.H5("How Do I Read an IV Curve Graph?"),
+            html.H6("To read an IV curve graph, follow the curve's trajectory. The x-axis represents voltage, and the y-axis represents current. The curve starts at Voc, passes through different voltage-current combinations, and peaks at Pmax."),
+            html.Hr(),
+            html.H5("Why Are IV Curves Important for Solar Panel Testing?"),
+            html.H6("IV curves are essential for evaluating a solar panel's performance and efficiency under different conditions. They help identify issues, degradation, and deviations from expected values, ensuring reliable operation."),
+            html.Hr(),
+            html.H5("How Can IV Curves Help in Diagnosing Solar Panel Issues?"),
+            html.H6("IV curves can diagnose issues by revealing deviations from expected curve shapes and parameter values. Irregularities in the curve can indicate shading, damage, degradation, or electrical faults in the panel."),
+            html.Hr(),
+            html.H5("What Is the Lambert W Method for Calculating IV Curves?"),
+            html.H6("The Lambert W method is a mathematical approach used to calculate IV curves. It is particularly useful when dealing with nonlinear curves and allows for precise determination of key parameters."),
+            html.Hr()
+            ])
+        ])
+
+
+# Define your app's "Contact" page layout
+@functools.lru_cache(maxsize=None)
+def contact_page():
+    return dbc.Container([
+        dbc.Row([
+            dbc.Col([
+                dcc.Markdown("# Contact")
+            ], width=True),
+        ], align="end"),
+        html.Hr(),
+        dbc.Row([
+            html.Iframe(
+                src='https://docs.google.com/forms/d/e/1FAIpQLSe9bizwPKrj5Oaeehhruycgtr7MFDlNSyT3vLJupQnv89QD4g/viewform?embedded=true',
+                width='1000px',
+                height='800px',
+            )
+        ]),
+    ])
+
+
+def _option(name):
+    option = {'label': name, 'value': name}
+    search = search_text(name)
+    if search:
+        option['search'] = search
+    return option
+
+
+def search_options(names, total, query='', selected=None):
+    """Dropdown options for one page of search results.
+
+    The selected value stays listed even when it is not on the page, and a
+    disabled last option says how many more matches there are.
+    """
+    options = [_option(name) for name in names]
+    if selected is not None and selected not in names:
+        options.insert(0, _option(selected))
+    if total > len(names):
+        options.append({'label': '%d more, keep typing to narrow down' % (total - len(names)), 'value': '',
+                        'search': query or '', 'disabled': True})
+    return options
+
+
+def range_inputs(id_prefix, unit):
+    # Optional min and max number inputs for one catalog column
+    return dbc.InputGroup([
+        dbc.Input(id=id_prefix + '-min', type="number", placeholder="min"),
+        dbc.Input(id=id_prefix + '-max', type="number", placeholder="max"),
+        dbc.InputGroupText(unit),
+    ], size="sm")
+
+
+# Define your app's "Home" page layout. manufacturers: first page of manufacturer
+# names and their total count (the rest are searched on the server);
+# technologies: options of the compare filter; today: default degradation
+# dates, so the cached page is rebuilt daily
+@functools.lru_cache(maxsize=4)
+def home_page(manufacturers, technologies, today):
+    names, total = manufacturers
+    dropdown_manuf = dcc.Dropdown(id='manufacturer-dropdown', options=search_options(names, total, selected=DEFAULT_MANUFACTURER),
+                                  value=DEFAULT_MANUFACTURER, clearable=False)
+    dropdown_mod = dcc.Dropdown(id='model-dropdown', options=[])
+
+    # Parameter dropdown
+    dropdown_parameters = dcc.Dropdown(id='parameters-dropdown', options=['Pmp', 'Power Curve'], clearable=True)
+
+    # Scale inputs
+    irradiance_input = dbc.Input(id="irradiance-input", type="number", value=1000, min=0, max=1500, step=0.01)
+    temperature_input = dbc.Input(id="temperature-input", type="number", value=25, min=-100, max=100, step=0.01)
+    string_input = dbc.Input(id="string-input", type="number", value=1, min=1, max=50, step=1)
+
+    # Degrade inputs
+    degradation_date_picker = dcc.DatePickerRange(id='degradation-date-range', 
+                                                 start_date=date(today.year, today.month, today.day), clearable=True,
+                                                 end_date=date(today.year, today.month, today.day))
+    degradation_input = dbc.Input(id="degradation-input", type="number", value=0.5, min=0, max=100, step=0.01)
+
+    # Fleet projection inputs
+    fleet_upload = dcc.Upload(
+        id='fleet-upload',
+        children=html.Div(['Drop or ', html.A('select'), ' a weather CSV']),
+        style={'borderWidth': '1px', 'borderStyle': 'dashed', 'borderRadius': '5px', 'textAlign': 'center', 'padding': '10px'},
+    )
+    fleet_step = dcc.Dropdown(id='fleet-step', options=[{'label': 'Daily', 'value': 'D'}, {'label': 'Weekly', 'value': 'W'},
+                                                        {'label': 'Monthly', 'value': 'MS'}], value='MS', clearable=False)
+
+    # Compare inputs
+    compare_technology = dcc.Dropdown(id='compare-technology', options=list(technologies), multi=True, placeholder="Any")
+    compare_bifacial = dcc.Dropdown(id='compare-bifacial', options=[{'label': 'Any', 'value': 'any'}, {'label': 'Bifacial', 'value': 'yes'},
+                                                                    {'label': 'Monofacial', 'value': 'no'}], value='any', clearable=False)
+    compare_by = dcc.Dropdown(id='compare-by', options=[{'label': 'Pmp', 'value': 'pmp'},
+                                                        {'label': 'Efficiency (Pmp / A_c)', 'value': 'efficiency'}], value='pmp', clearable=False)
+    compare_top = dbc.Input(id="compare-top", type="number", value=20, min=1, max=500, step=1)
+
+    # IMPORT DATA INPUT
+    import_input = dash_table.DataTable(
+        id='import-input',
+        columns=[{'name': col, 'id': col, 'type': 'numeric'} for col in ['Voltage', 'Current']],
+        data=[{'Voltage': None, 'Current': None} for _ in range(10)],
+        editable=True,
+        style_table={'textAlign': 'center'},
+        style_cell={'textAlign': 'center'},
+        style_header={'textAlign': 'center'},
+    )
+
+    return dbc.Container(
+        [
+            dbc.Row([
+                dbc.Col([
+                    dcc.Markdown("# IV Curve Database & Analysis Tool")
+                ], width=True),
+            ], align="end"),
+            html.Hr(),
+            dbc.Row([
+                dbc.Col([
+                    dbc.Button("Select module", id="module_button"),
+                    dbc.Collapse(
+                        dbc.Card(
+                            dbc.CardBody([
+                                html.H6('Manufacturer:'),
+                                dropdown_manuf,
+                                html.Hr(),
+                                html.H6("Model:"),
+                                dropdown_mod,
+                                html.Hr(),
+                                dbc.Row([  # Create a row for Irradiance, Temperature, and Modules per String
+                                    dbc.Col([html.H6("Irradiance (W/m2)"), irradiance_input], width=4),
+                                    dbc.Col([html.H6("Temperature (°C)"), temperature_input], width=4),
+                                    dbc.Col([html.H6("Modules per String"), string_input], width=4),
+                                ]),
+                                html.Hr(),
+                                dbc.Row([  # Create DataTable for Pmp, Isc, Voc, Imp, Vmp
+                                    dbc.Col(dash_table.DataTable(
+                                        id='module-parameters-table',
+                                        columns=[{'name': col, 'id': col, 'type': 'numeric'} for col in ["Pmp", "Isc", "Voc", "Imp", "Vmp"]],
+                                        data=[{}],
+                                        style_table={'textAlign': 'center'},
+                                        style_cell={'textAlign': 'center'},
+                                        style_header={'textAlign': 'center'},
+                                    ), width=12),
+                                ]),
+                            ])
+                        ),
+                        id="module_collapse",
+                        is_open=False
+                    ),
+                    html.Hr(),
+                    # ADD PARAMETERS
+                    dbc.Button("Add parameters", id="parameter_button"),
+                    dbc.Collapse(
+                        dbc.Card(
+                            dbc.CardBody(dropdown_parameters),
+                        ),
+                        id="parameter_collapse",
+                        is_open=False
+                    ),
+                    html.Hr(),
+                    # DEGRADE
+                    dbc.Button("Degrade", id="degrade_button"),
+                    dbc.Collapse(
+                        dbc.Card(
+                            dbc.CardBody([
+                                html.H6("Install Date --> Measurement Date"),
+                                degradation_date_picker,
+                                html.Hr(),
+                                html.H6("Expected Degradation (%/year):"),
+                                degradation_input
+                            ])
+                        ),
+                        id="degrade_collapse",
+                        is_open=False
+                    ),
+                    html.Hr(),
+                    # PROJECT DEGRADATION OVER TIME
+                    dbc.Button("Project degradation", id="fleet_button"),
+                    dbc.Collapse(
+                        dbc.Card(
+                            dbc.CardBody([
+                                html.H6("Uses the Degrade dates and rate. Without weather data, the selected conditions are "
+                                        "projected from the install date to the measurement date (25 years if they match)."),
+                                html.Hr(),
+                                html.H6("Step:"),
+                                fleet_step,
+                                html.Hr(),
+                                html.H6("Weather data (timestamp, irradiance, temperature):"),
+                                fleet_upload,
+                                html.Hr(),
+                                dbc.Button("Run projection", id="fleet-run", color="secondary"),
+                                dbc.Button("Download table", id="fleet-download-button", color="secondary", style={"margin-left": "10px"}),
+                                dcc.Download(id='fleet-download'),
+                                dbc.Progress(id='fleet-progress', value=0, max=1, style={'display': 'none'}),
+                            ])
+                        ),
+                        id="fleet_collapse",
+                        is_open=False
+                    ),
+                    html.Hr(),
+                    # COMPARE MODULES
+                    dbc.Button("Compare modules", id="compare_button"),
+                    dbc.Collapse(
+                        dbc.Card(
+                            dbc.CardBody([
+                                html.H6("Ranks catalog modules at the selected irradiance and temperature."),
+                                html.Hr(),
+                                html.H6("Technology:"),
+                                compare_technology,
+                                html.H6("Bifacial:"),
+                                compare_bifacial,
+                                html.H6("STC power:"),
+                                range_inputs('compare-stc', "W"),
+                                html.H6("Cells in series (N_s):"),
+                                range_inputs('compare-cells', "cells"),
+                                html.H6("Area (A_c):"),
+                                range_inputs('compare-area', "m2"),
+                                html.Hr(),
+                                html.H6("Rank by:"),
+                                compare_by,
+                                html.H6("Show top:"),
+                                compare_top,
+                                html.Hr(),
+                                dbc.Button("Compare", id="compare-run", color="secondary"),
+                                dbc.Progress(id='compare-progress', value=0, max=1, style={'display': 'none'}),
+                            ])
+                        ),
+                        id="compare_collapse",
+                        is_open=False
+                    ),
+                    html.Hr(),
+                    # IMPORT YOUR DATA
+                    dbc.Button("Import your data", id="import_button"),
+                    dbc.Collapse(
+                        dbc.Card(
+                            dbc.CardBody([import_input]),
+                        ),
+                        id="import_collapse",
+                        is_open=False
+                    ),
+                    html.Hr(),
+                    # ANALYZE YOUR DATA
+                    dbc.Button("Analyze your data", id="analyze_button"),
+                    dbc.Collapse(
+                        dbc.Card(
+                            dbc.CardBody([
+                                dbc.Row([  # Create DataTable for Pmp, Isc, Voc, Imp, Vmp
+                                    dbc.Col(dash_table.DataTable(
+                                        id='my-parameters-table',
+                                        columns=[{'name': col, 'id': col, 'type': 'numeric'} for col in ["Pmp", "Isc", "Voc", "Imp", "Vmp"]],
+                                        data=[{}],
+                                        style_table={'textAlign': 'center'},
+                                        style_cell={'textAlign': 'center'},
+                                        style_header={'textAlign': 'center'},
+                                    ), width=12),
+                                ]),
+                                html.Hr(),
+                                html.H6("Single-diode fit vs. selected module:"),
+                                dbc.Row([  # Fitted IL, I0, Rs, Rsh, nNsVth against the catalog values
+                                    dbc.Col(dash_table.DataTable(
+                                        id='fit-parameters-table',
+                                        columns=[{'name': col, 'id': col} for col in ["Parameter", "Fitted", "Catalog", "Deviation (%)"]],
+                                        data=[],
+                                        style_table={'textAlign': 'center'},
+                                        style_cell={'textAlign': 'center'},
+                                        style_header={'textAlign': 'center'},
+                                    ), width=12),
+                                ]),
+                                ]),
+                        ),
+                        id="analyze_collapse",
+                        is_open=False
+                    ),
+                ], width=3),
+                dbc.Col([
+                    dcc.Graph(id='display', figure=iv_figure(), style={'height': '80vh'}),
+                    dcc.Store(id='base-curve'),
+                    dcc.Graph(id='fleet-display', style={'display': 'none'}),
+                    html.Div([
+                        html.H6(id='compare-summary'),
+                        dash_table.DataTable(
+                            id='compare-table',
+                            columns=[{'name': col, 'id': col} for col in RANK_COLUMNS],
+                            data=[],
+                            sort_action='native',
+                            page_size=20,
+                            style_table={'overflowX': 'auto'},
+                        ),
+                    ], id='compare-results', style={'display': 'none'}),
+                ], width=9, align="start")
+            ]),
+
+            html.Hr(),
+
+            dcc.Markdown("""
+                © 2023 StreetPlant Solar. All Rights Reserved.
+            """)
+
+        ],
+        fluid=True
+    )
@@ -0,0 +1,208 @@
+"""Latency histograms for callbacks and solver stages, in Prometheus text format.
+
+Stages are timed with span(), a context manager cheap enough for hot paths
+(two perf_counter calls and a bucket increment), every registered Dash
+callback is wrapped by instrument_callbacks() and every Flask request is
+timed by instrument_requests(). The gap between a /_dash-update-component
+request and its callback is Dash's own dispatch. render() gives the text
+served on /metrics:
+
+    ivcurves_callback_seconds_bucket{callback="create_model_IV",le="0.01"} 42
+    ivcurves_stage_seconds_sum{stage="singlediode"} 0.8123
+
+Each gunicorn worker keeps its own histograms, so a scrape sees the worker
+that answered it; the 'worker' label (its pid) tells them apart.
+
+Setting SAMPLING_PROFILER_INTERVAL (milliseconds, e.g. 10) starts a
+sampling profiler in the worker. It records the stack of every thread at
+that interval, in the collapsed format flame graph tools read, and adds no
+cost when unset.
+"""
+import functools
+import os
+import sys
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+# Upper bounds in seconds; the last bucket (+Inf) is implicit
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+class Histogram:
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, seconds):
+        k = bisect_left(self.buckets, seconds)
+        with self._lock:
+            self.counts[k] += 1
+            self.sum += seconds
+
+    def snapshot(self):
+        with self._lock:
+            return list(self.counts), self.sum
+
+
+class Family:
+    """Histograms of one metric, one per value of its label."""
+
+    def __init__(self, name, label, help_text):
+        self.name = name
+        self.label = label
+        self.help = help_text
+        self.histograms = {}
+        self._lock = threading.Lock()
+
+    def get(self, value):
+        histogram = self.histograms.get(value)
+        if histogram is None:
+            with self._lock:
+                histogram = self.histograms.setdefault(value, Histogram())
+        return histogram
+
+    def render(self, worker):
+        lines = ['# HELP %s %s' % (self.name, self.help), '# TYPE %s histogram' % self.name]
+        for value, histogram in sorted(self.histograms.items()):
+            counts, total = histogram.snapshot()
+            labels = '%s="%s",worker="%s"' % (self.label, value, worker)
+            cumulative = 0
+            for bound, count in zip(histogram.buckets + ('+Inf',), counts):
+                cumulative += count
+                lines.append('%s_bucket{%s,le="%s"} %d' % (self.name, labels, bound, cumulative))
+            lines.append('%s_sum{%s} %.6f' % (self.name, labels, total))
+            lines.append('%s_count{%s} %d' % (self.name, labels, cumulative))
+        return lines
+
+
+callbacks = Family('ivcurves_callback_seconds', 'callback', 'Dash callback time, including response serialization.')
+stages = Family('ivcurves_stage_seconds', 'stage', 'Time spent in each stage of the IV curve hot path.')
+requests = Family('ivcurves_request_seconds', 'route', 'HTTP request time by Flask route.')
+
+
+@contextmanager
+def span(stage):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        stages.get(stage).observe(time.perf_counter() - started)
+
+
+def timed(name, func):
+    # func wrapped to record its time in the callback histograms
+    histogram = callbacks.get(name)
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            histogram.observe(time.perf_counter() - started)
+    return wrapper
+
+
+def instrument_callbacks(app):
+    """Time every server-side callback registered on app so far.
+
+    Callbacks are labelled by function name, plus their output when one
+    function serves several outputs (e.g. one toggle for every menu).
+    """
+    entries = [(output, entry) for output, entry in app.callback_map.items() if entry.get('callback') is not None]
+    names = [entry['callback'].__name__ for output, entry in entries]
+    for output, entry in entries:
+        func = entry['callback']
+        if getattr(func, '_timed', False):
+            continue
+        label = func.__name__
+        if names.count(label) > 1:
+            label = '%s:%s' % (label, output.strip('.'))
+        entry['callback'] = timed(label, func)
+        entry['callback']._timed = True
+
+
+def instrument_requests(server):
+    """Time every request to server by its route (not its path, to bound the labels)."""
+    from flask import g, request
+
+    @server.before_request
+    def start_timer():
+        g.metrics_started = time.perf_counter()
+
+    @server.after_request
+    def observe(response):
+        started = g.pop('metrics_started', None)
+        if started is not None:
+            rule = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+            requests.get(rule).observe(time.perf_counter() - started)
+        return response
+
+
+def render(gauges=(), counters=()):
+    """Prometheus text for all histograms, plus (name, help, {labels: value}) gauges and counters.
+
+    Counter names end in _total; labels may be '' for a counter without any.
+    """
+    worker = os.getpid()
+    lines = requests.render(worker) + callbacks.render(worker) + stages.render(worker)
+    for kind, samples in (('gauge', gauges), ('counter', counters)):
+        for name, help_text, values in samples:
+            lines += ['# HELP %s %s' % (name, help_text), '# TYPE %s %s' % (name, kind)]
+            for labels, value in sorted(values.items()):
+                labels = '%s,worker="%s"' % (labels, worker) if labels else 'worker="%s"' % worker
+                lines.append('%s{%s} %s' % (name, labels, value))
+    return '\n'.join(lines) + '\n'
+
+
+class SamplingProfiler:
+    """Counts the stacks of all other threads every interval seconds."""
+
+    def __init__(self, interval, max_stacks=20000):
+        self.interval = interval
+        self.max_stacks = max_stacks
+        self.stacks = {}
+        self.samples = 0
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, name='sampling-profiler', daemon=True)
+
+    @classmethod
+    def from_env(cls):
+        interval = float(os.environ.get('SAMPLING_PROFILER_INTERVAL', 0))
+        if interval <= 0:
+            return None
+        profiler = cls(interval / 1000)
+        profiler._thread.start()
+        return profiler
+
+    def _run(self):
+        own = threading.get_ident()
+        while True:
+            time.sleep(self.interval)
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own:
+                    continue
+                stack = []
+                while frame is not None and len(stack) < 64:
+                    code = frame.f_code
+                    stack.append('%s:%s' % (os.path.basename(code.co_filename), code.co_name))
+                    frame = frame.f_back
+                key = ';'.join(reversed(stack))
+                with self._lock:
+                    if key in self.stacks or len(self.stacks) < self.max_stacks:
+                        self.stacks[key] = self.stacks.get(key, 0) + 1
+                    self.samples += 1
+
+    def collapsed(self, reset=False):
+        # "frame;frame;frame count" lines, hottest first
+        with self._lock:
+            stacks = sorted(self.stacks.items(), key=lambda item: -item[1])
+            if reset:
+                self.stacks = {}
+                self.samples = 0
+        return ''.join('%s %d\n' % item for item in stacks)
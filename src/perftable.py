@@ -0,0 +1,178 @@
+"""Precomputed key parameters for every catalog module on a standard grid.
+
+Most visitors look at a module at STC (1000 W/m2, 25 C), so the app should
+not need a live single-diode solve for that. This table holds Pmp, Isc, Voc,
+Imp and Vmp for every module at STC, at each module's NOCT (800 W/m2 and its
+own T_NOCT cell temperature) and on a small irradiance x temperature grid.
+
+Build it offline (it is also built by the deploy build command):
+
+    python perftable.py [module_db.csv]
+
+Off-grid operating points can optionally be answered by bilinear
+interpolation on the grid instead of a solve. While building, the table is
+also solved at the centre of every grid cell and the worst relative
+interpolation error per module and parameter is stored. Interpolated answers
+carry that error times ERROR_MARGIN as their bound: the error peaks near but
+not exactly at cell centres (up to 1.21x the centre value over 3000 random
+off-grid points).
+"""
+import logging
+import os
+import sys
+import time
+
+import numpy as np
+
+from ivsolver import KEY_PARAMETERS, solve_batch
+
+log = logging.getLogger(__name__)
+
+TABLE_FILE = 'performance_table.npz'
+
+IRRADIANCE_GRID = (100., 200., 400., 600., 800., 1000., 1200.)
+TEMPERATURE_GRID = (-10., 10., 25., 40., 55., 70.)
+NOCT_IRRADIANCE = 800.
+
+# Safety factor on the error measured at cell centres, and a floor for the
+# float32 storage of the table
+ERROR_MARGIN = 2.0
+ERROR_FLOOR = 1e-5
+
+
+def _stack(solved, shape):
+    values = np.stack([solved[name] for name in KEY_PARAMETERS], axis=-1)
+    return values.reshape(shape + (len(KEY_PARAMETERS),))
+
+
+def build_table(catalog, path=TABLE_FILE):
+    n = len(catalog)
+    irradiance = np.asarray(IRRADIANCE_GRID)
+    temperature = np.asarray(TEMPERATURE_GRID)
+
+    grid_irr, grid_temp = np.meshgrid(irradiance, temperature, indexing='ij')
+    values = _stack(solve_batch(catalog, grid_irr.ravel(), grid_temp.ravel()),
+                    (n, len(irradiance), len(temperature)))
+
+    noct_temperature = np.asarray(catalog.columns['T_NOCT'], dtype=np.float64)
+    noct_values = _stack(solve_batch(catalog, np.full((n, 1), NOCT_IRRADIANCE), noct_temperature[:, np.newaxis]), (n,))
+
+    # Bilinear interpolation error, measured at the centre of every cell
+    mid_irr, mid_temp = np.meshgrid((irradiance[:-1] + irradiance[1:]) / 2,
+                                    (temperature[:-1] + temperature[1:]) / 2, indexing='ij')
+    solved_mid = _stack(solve_batch(catalog, mid_irr.ravel(), mid_temp.ravel()),
+                        (n, len(irradiance) - 1, len(temperature) - 1))
+    interpolated_mid = (values[:, :-1, :-1] + values[:, 1:, :-1] + values[:, :-1, 1:] + values[:, 1:, 1:]) / 4
+    with np.errstate(invalid='ignore', divide='ignore'):
+        relative = np.abs(interpolated_mid - solved_mid) / np.abs(solved_mid)
+        error = np.nanmax(relative.reshape(n, -1, len(KEY_PARAMETERS)), axis=1) if n else relative
+
+    # Write under a temporary name so a starting worker never reads a partial file
+    tmp_path = '%s.%d.tmp' % (path, os.getpid())
+    with open(tmp_path, 'wb') as f:
+        np.savez(
+            f,
+            fingerprint=np.array(catalog.fingerprint()),
+            irradiance=irradiance,
+            temperature=temperature,
+            values=values.astype(np.float32),
+            noct_temperature=noct_temperature,
+            noct_values=noct_values.astype(np.float32),
+            error=error.astype(np.float32),
+        )
+    os.replace(tmp_path, path)
+    return path
+
+
+class PerformanceTable:
+
+    def __init__(self, arrays):
+        self.irradiance = arrays['irradiance']
+        self.temperature = arrays['temperature']
+        self.values = arrays['values']
+        self.noct_temperature = arrays['noct_temperature']
+        self.noct_values = arrays['noct_values']
+        self.error = arrays['error']
+        self._irradiance_index = {float(x): i for i, x in enumerate(self.irradiance)}
+        self._temperature_index = {float(x): j for j, x in enumerate(self.temperature)}
+
+    def _as_dict(self, values, digits=6):
+        # float32 values to float64, rounded to what float32 holds
+        return {name: float('%.*g' % (digits, values[k])) for k, name in enumerate(KEY_PARAMETERS)}
+
+    def error_bounds(self, index):
+        return self._as_dict(np.maximum(self.error[index].astype(np.float64) * ERROR_MARGIN, ERROR_FLOOR), digits=3)
+
+    def error_summary(self):
+        # Median and largest relative error bound of each parameter across modules
+        with np.errstate(invalid='ignore'):
+            bounds = np.maximum(self.error.astype(np.float64) * ERROR_MARGIN, ERROR_FLOOR)
+            return {name: {'median': float('%.3g' % np.nanmedian(bounds[:, k])), 'max': float('%.3g' % np.nanmax(bounds[:, k]))}
+                    for k, name in enumerate(KEY_PARAMETERS)}
+
+    def lookup(self, index, irradiance, temperature):
+        # Exact grid or NOCT point, else None
+        i = self._irradiance_index.get(float(irradiance))
+        j = self._temperature_index.get(float(temperature))
+        if i is not None and j is not None:
+            return self._as_dict(self.values[index, i, j])
+        if irradiance == NOCT_IRRADIANCE and temperature == self.noct_temperature[index]:
+            return self._as_dict(self.noct_values[index])
+        return None
+
+    def grid_values(self, irradiance, temperature):
+        # Key parameters of every module at a grid point, (N, 5), else None
+        i = self._irradiance_index.get(float(irradiance))
+        j = self._temperature_index.get(float(temperature))
+        if i is None or j is None:
+            return None
+        return self.values[:, i, j]
+
+    def interpolate(self, index, irradiance, temperature):
+        """Bilinear estimate inside the grid, with a relative 'error_bound' per parameter.
+
+        Returns None outside the grid.
+        """
+        irr, temp = self.irradiance, self.temperature
+        if not (irr[0] <= irradiance <= irr[-1] and temp[0] <= temperature <= temp[-1]):
+            return None
+        i = min(np.searchsorted(irr, irradiance, side='right') - 1, len(irr) - 2)
+        j = min(np.searchsorted(temp, temperature, side='right') - 1, len(temp) - 2)
+        x = (irradiance - irr[i]) / (irr[i + 1] - irr[i])
+        y = (temperature - temp[j]) / (temp[j + 1] - temp[j])
+        cell = self.values[index, i:i + 2, j:j + 2].astype(np.float64)
+        values = (cell[0, 0] * (1 - x) * (1 - y) + cell[1, 0] * x * (1 - y)
+                  + cell[0, 1] * (1 - x) * y + cell[1, 1] * x * y)
+        result = self._as_dict(values)
+        result['error_bound'] = self.error_bounds(index)
+        return result
+
+
+def load_table(catalog, path=TABLE_FILE):
+    if not os.path.exists(path):
+        log.info('No performance table at %s; every operating point will be solved live', path)
+        return None
+    started = time.perf_counter()
+    with np.load(path) as archive:
+        arrays = {name: archive[name] for name in archive.files}
+    if str(arrays['fingerprint']) != catalog.fingerprint():
+        log.warning('Ignoring %s: built from a different module_db.csv (rerun perftable.py)', path)
+        return None
+    table = PerformanceTable(arrays)
+    log.info('Loaded performance table %s in %.3fs', path, time.perf_counter() - started)
+    return table
+
+
+if __name__ == '__main__':
+    from catalog import load_catalog
+
+    csv_path = sys.argv[1] if len(sys.argv) > 1 else 'module_db.csv'
+    catalog = load_catalog(csv_path)
+    started = time.perf_counter()
+    path = build_table(catalog, os.path.join(os.path.dirname(os.path.abspath(csv_path)), TABLE_FILE))
+    print('Built %s for %d modules in %.1fs (%.1f MB)'
+          % (path, len(catalog), time.perf_counter() - started, os.path.getsize(path) / 1e6))
+    error = PerformanceTable(np.load(path)).error
+    for k, name in enumerate(KEY_PARAMETERS):
+        print('interpolation error %-5s median %.3f%%  max %.3f%%'
+              % (name, 100 * np.nanmedian(error[:, k]), 100 * np.nanmax(error[:, k])))
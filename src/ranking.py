@@ -0,0 +1,96 @@
+"""Filter the module catalog and rank the matches by output at one site.
+
+Filters are boolean masks over the catalog's columns, the matching modules
+are solved together in one batch (or read from the performance table when
+the conditions are on its grid), and the top K are picked with a partial
+sort, so there is no Python loop over modules:
+
+    ranked = rank_modules(catalog, 850, 45, {'technology': ['Mono-c-Si'], 'stc_min': 400}, by='efficiency')
+"""
+import numpy as np
+
+from ivsolver import KEY_PARAMETERS, solve_batch
+
+RANK_BY = ('pmp', 'efficiency')
+RANK_COLUMNS = ['Manufacturer', 'Model', 'Technology', 'Bifacial', 'STC', 'N_s', 'A_c', 'Pmp', 'W/m2', 'Efficiency (%)']
+
+# Filter name -> (catalog column, comparison)
+RANGE_FILTERS = {
+    'stc_min': ('STC', np.greater_equal),
+    'stc_max': ('STC', np.less_equal),
+    'cells_min': ('N_s', np.greater_equal),
+    'cells_max': ('N_s', np.less_equal),
+    'area_min': ('A_c', np.greater_equal),
+    'area_max': ('A_c', np.less_equal),
+}
+
+
+def technologies(catalog):
+    return sorted(tech for tech in set(catalog.columns['Technology'].tolist()) if tech)
+
+
+def filter_modules(catalog, filters):
+    """Catalog rows matching filters, as an index array.
+
+    filters may hold 'technology' (a list of names), 'bifacial' (True or
+    False), 'manufacturer' and any of RANGE_FILTERS; None values are ignored.
+    Modules without usable CEC parameters never match.
+    """
+    columns = catalog.columns
+    mask = np.ones(len(catalog), dtype=bool)
+    for values in catalog.cec.values():
+        mask &= np.isfinite(values)
+    if filters.get('technology'):
+        mask &= np.isin(columns['Technology'], list(filters['technology']))
+    if filters.get('bifacial') is not None:
+        mask &= (columns['Bifacial'] != 0) == bool(filters['bifacial'])
+    if filters.get('manufacturer'):
+        mask &= columns['Manufacturer'] == filters['manufacturer']
+    for name, (column, compare) in RANGE_FILTERS.items():
+        if filters.get(name) is not None:
+            mask &= compare(columns[column], float(filters[name]))
+    return np.flatnonzero(mask)
+
+
+def site_pmp(catalog, rows, irradiance, temperature, table=None, progress=None):
+    # Pmp of every row at one operating point
+    if table is not None:
+        values = table.grid_values(irradiance, temperature)
+        if values is not None:
+            return values[rows, KEY_PARAMETERS.index('p_mp')].astype(np.float64)
+    with np.errstate(all='ignore'):
+        return solve_batch(catalog, irradiance, temperature, indices=rows, progress=progress)['p_mp'][:, 0]
+
+
+def rank_modules(catalog, irradiance, temperature, filters, by='pmp', top=20, table=None, progress=None):
+    """Top modules matching filters by Pmp or efficiency at the given conditions.
+
+    Returns a dict of RANK_COLUMNS arrays, best first, and 'matched', the
+    number of modules that passed the filters. progress(done, total) is
+    passed on to solve_batch.
+    """
+    if by not in RANK_BY:
+        raise ValueError('rank by one of %s' % ', '.join(RANK_BY))
+    if not irradiance or irradiance <= 0:
+        raise ValueError('irradiance must be positive')
+    if top is None or int(top) < 1:
+        raise ValueError('top must be at least 1')
+    rows = filter_modules(catalog, filters)
+    pmp = site_pmp(catalog, rows, irradiance, temperature, table, progress)
+    area = catalog.columns['A_c'][rows].astype(np.float64)
+    density = pmp / area
+    score = np.nan_to_num(pmp if by == 'pmp' else density, nan=-np.inf)
+
+    # Partial sort: only the top K are ordered
+    k = min(int(top), len(rows))
+    best = np.argpartition(-score, k - 1)[:k] if k else np.empty(0, dtype=np.intp)
+    best = best[np.argsort(-score[best], kind='mergesort')]
+
+    picked = rows[best]
+    columns = catalog.columns
+    ranked = {name: columns[name][picked] for name in RANK_COLUMNS[:7]}
+    ranked['Pmp'] = pmp[best]
+    ranked['W/m2'] = density[best]
+    ranked['Efficiency (%)'] = 100 * density[best] / irradiance
+    ranked['matched'] = len(rows)
+    return ranked
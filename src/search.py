@@ -0,0 +1,90 @@
+"""Typeahead search over module and manufacturer names.
+
+Names are split into lower-case alphanumeric tokens ("LR6-72HV-355M" ->
+lr6, 72hv, 355m, plus the compacted lr672hv355m) and every (token, entry)
+pair is kept in one sorted array. A query matches the entries that have a
+token starting with each of its words, found by binary search, so a lookup
+costs the same however large the catalog grows. Only one page of matches is
+returned to the browser at a time.
+"""
+import os
+import re
+import numpy as np
+
+# Matches returned per page, e.g. options shown in a dropdown
+PAGE_SIZE = int(os.environ.get('SEARCH_PAGE_SIZE', 50))
+
+WORD = re.compile(r'[0-9a-z]+')
+
+
+def tokens(name):
+    words = WORD.findall(str(name).lower())
+    if len(words) > 1:
+        words.append(''.join(words))
+    return words
+
+
+def search_text(name):
+    # Option 'search' text for dcc.Dropdown. Its client-side filter prefix-matches
+    # the whitespace separated words of the label, so this adds the tokens that
+    # would not match that way, keeping the browser from hiding our results.
+    words = str(name).lower().split()
+    return ' '.join(token for token in tokens(name) if not any(word.startswith(token) for word in words))
+
+
+class PrefixIndex:
+
+    def __init__(self, names, extra=None):
+        # names: one display name per entry; extra: optional further text per
+        # entry whose tokens also match (e.g. the module's manufacturer)
+        self.size = len(names)
+        extra_tokens = {}
+        keys, entries, leading = [], [], []
+        for i, name in enumerate(names):
+            words = tokens(name)
+            leading.append(words[-1] if words else '')
+            if extra is not None:
+                if extra[i] not in extra_tokens:
+                    extra_tokens[extra[i]] = tokens(extra[i])
+                words = set(words).union(extra_tokens[extra[i]])
+            keys.extend(words)
+            entries.extend([i] * len(words))
+        self._keys, self._entries = self._sorted(keys, entries)
+        # Compacted full names, to rank names that start with the query first
+        self._leading, self._leading_entries = self._sorted(leading, range(self.size))
+
+    @staticmethod
+    def _sorted(keys, entries):
+        # Tokens are ASCII, so one byte per character rather than numpy's four for str
+        keys = np.array([key.encode('ascii') for key in keys], dtype=np.bytes_)
+        entries = np.array(entries, dtype=np.intp)
+        order = np.argsort(keys, kind='mergesort')
+        return keys[order], entries[order]
+
+    @staticmethod
+    def _prefixed(keys, entries, prefix):
+        prefix = prefix.encode('ascii')
+        lo, hi = np.searchsorted(keys, [prefix, prefix + b'\xff'])
+        return np.unique(entries[lo:hi])
+
+    def search(self, query, within=None):
+        """Sorted-by-relevance entries matching every word of query.
+
+        within optionally restricts the result to a sorted array of entries.
+        Names starting with the query come first; ties keep entry order.
+        """
+        words = WORD.findall(str(query or '').lower())
+        matches = np.arange(self.size) if within is None else np.asarray(within, dtype=np.intp)
+        for word in words:
+            matches = np.intersect1d(matches, self._prefixed(self._keys, self._entries, word), assume_unique=True)
+        if not words:
+            return matches
+        leading = self._prefixed(self._leading, self._leading_entries, ''.join(words))
+        first = np.isin(matches, leading, assume_unique=True)
+        return np.concatenate([matches[first], matches[~first]])
+
+
+def page_of(matches, page=0, size=PAGE_SIZE):
+    # One page of a match array, and the total number of matches
+    page = max(int(page), 0)
+    return matches[page * size:(page + 1) * size], len(matches)
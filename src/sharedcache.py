@@ -0,0 +1,217 @@
+"""Solved IV curves shared by every worker, and kept across restarts.
+
+The in-process CurveCache (ivsolver.py) is per worker, so a popular module
+at STC used to be solved once by every gunicorn worker and again after each
+restart. A shared store sits behind it: local misses look here before
+solving, and every solve is written here.
+
+    IV_SHARED_CACHE=sqlite:////var/tmp/ivcurves.db  one file for all workers on a host
+    IV_SHARED_CACHE=redis://localhost:6379/0        needs the redis package
+    IV_SHARED_CACHE_TTL=604800                      seconds a result is kept
+    IV_SHARED_CACHE_MAX_MB=256                      size cap for the SQLite store
+
+Curves are stored as packed little-endian float64 arrays (about 1.2 KB for
+75 points), not pickles. Keys include a catalog fingerprint, so entries from
+an older module database are never returned. The store is best effort: any
+backend error is logged and treated as a miss. Redis evicts by its own
+maxmemory policy (use allkeys-lru); the SQLite store evicts expired entries
+and then the least recently used ones when it grows past its size cap.
+"""
+import logging
+import os
+import sqlite3
+import struct
+import threading
+import time
+
+import numpy as np
+
+from ivsolver import KEY_PARAMETERS
+
+log = logging.getLogger(__name__)
+
+TTL = 7 * 24 * 3600
+MAX_BYTES = 256 * 1024 * 1024
+
+# Key parameters, the interpolation error bound of each (NaN when solved) and
+# the number of curve points, followed by the voltage and current arrays
+HEADER = struct.Struct('<%ddI' % (2 * len(KEY_PARAMETERS)))
+# Part of every key, so entries in an older layout are never decoded
+FORMAT = 2
+
+
+def encode_curve(curve):
+    bounds = curve.get('error_bound', {})
+    header = HEADER.pack(*[float(curve[name]) for name in KEY_PARAMETERS],
+                         *[float(bounds.get(name, float('nan'))) for name in KEY_PARAMETERS], len(curve['v']))
+    return (header + np.asarray(curve['v'], dtype='<f8').tobytes()
+            + np.asarray(curve['i'], dtype='<f8').tobytes())
+
+
+def decode_curve(blob):
+    values = HEADER.unpack_from(blob)
+    points = values[-1]
+    arrays = np.frombuffer(blob, dtype='<f8', count=2 * points, offset=HEADER.size)
+    # frombuffer views are read-only, like the arrays the local cache hands out
+    curve = {'v': arrays[:points], 'i': arrays[points:]}
+    n = len(KEY_PARAMETERS)
+    for name, value in zip(KEY_PARAMETERS, values):
+        curve[name] = value
+    bounds = values[n:2 * n]
+    if not all(np.isnan(bounds)):
+        curve['error_bound'] = dict(zip(KEY_PARAMETERS, bounds))
+    return curve
+
+
+class SQLiteStore:
+    """Curves in one SQLite file, shared by every process that opens it."""
+
+    def __init__(self, path, ttl=TTL, max_bytes=MAX_BYTES):
+        self.path = path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._connection = None
+        self._pid = None
+        self._writes = 0
+
+    def _connect(self):
+        # One connection per process: connections must not cross a fork
+        if self._pid != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=5, check_same_thread=False, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            connection.execute('CREATE TABLE IF NOT EXISTS curves (key TEXT PRIMARY KEY, value BLOB NOT NULL, '
+                               'size INTEGER NOT NULL, expires REAL NOT NULL, accessed REAL NOT NULL)')
+            connection.execute('CREATE INDEX IF NOT EXISTS curves_accessed ON curves (accessed)')
+            self._connection, self._pid = connection, os.getpid()
+        return self._connection
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            connection = self._connect()
+            row = connection.execute('SELECT value, accessed FROM curves WHERE key = ? AND expires > ?',
+                                     (key, now)).fetchone()
+            # Recency only needs to be roughly right, so it is not written on every read
+            if row is not None and now - row[1] > 60:
+                connection.execute('UPDATE curves SET accessed = ? WHERE key = ?', (now, key))
+        return None if row is None else bytes(row[0])
+
+    def set(self, key, value):
+        now = time.time()
+        with self._lock:
+            connection = self._connect()
+            connection.execute('INSERT OR REPLACE INTO curves VALUES (?, ?, ?, ?, ?)',
+                               (key, value, len(value), now + self.ttl, now))
+            self._writes += 1
+            if self._writes % 64 == 1:
+                self._evict(connection, now)
+
+    def delete(self, key):
+        with self._lock:
+            self._connect().execute('DELETE FROM curves WHERE key = ?', (key,))
+
+    def _evict(self, connection, now):
+        connection.execute('DELETE FROM curves WHERE expires <= ?', (now,))
+        excess = (connection.execute('SELECT TOTAL(size) FROM curves').fetchone()[0] or 0) - self.max_bytes
+        if excess > 0:
+            # Least recently used first, until the store is back under its cap
+            removed = 0
+            keys = []
+            cursor = connection.execute('SELECT key, size FROM curves ORDER BY accessed')
+            for key, size in cursor:
+                keys.append(key)
+                removed += size
+                if removed >= excess:
+                    break
+            cursor.close()
+            connection.executemany('DELETE FROM curves WHERE key = ?', [(key,) for key in keys])
+
+    def __len__(self):
+        with self._lock:
+            return self._connect().execute('SELECT COUNT(*) FROM curves').fetchone()[0]
+
+
+class RedisStore:
+    """Curves in Redis (or anything speaking its protocol), with a TTL per key."""
+
+    def __init__(self, url, ttl=TTL):
+        import redis
+        self.client = redis.Redis.from_url(url)
+        self.ttl = ttl
+        self.errors = (redis.RedisError,)
+
+    def get(self, key):
+        return self.client.get(key)
+
+    def set(self, key, value):
+        # Redis only accepts whole seconds
+        self.client.set(key, value, ex=int(self.ttl))
+
+    def delete(self, key):
+        self.client.delete(key)
+
+
+class SharedCurveStore:
+    """Encodes curves and namespaces keys for a backend; never raises."""
+
+    def __init__(self, backend, namespace):
+        self.backend = backend
+        self.namespace = namespace
+        self.errors = getattr(backend, 'errors', ()) + (sqlite3.Error, OSError, struct.error)
+
+    def _key(self, key):
+        return 'iv%d:%s:%s' % (FORMAT, self.namespace, ':'.join(str(part) for part in key))
+
+    def get(self, key):
+        key = self._key(key)
+        try:
+            blob = self.backend.get(key)
+        except self.errors as e:
+            log.warning('Shared curve cache read failed: %s', e)
+            return None
+        if blob is None:
+            return None
+        try:
+            return decode_curve(blob)
+        except (struct.error, ValueError) as e:
+            # Truncated or corrupt entry: drop it so the curve is solved and stored again
+            log.warning('Shared curve cache entry %s is unreadable: %s', key, e)
+            try:
+                self.backend.delete(key)
+            except self.errors as e:
+                log.warning('Shared curve cache delete failed: %s', e)
+            return None
+
+    def set(self, key, curve):
+        try:
+            self.backend.set(self._key(key), encode_curve(curve))
+        except self.errors as e:
+            log.warning('Shared curve cache write failed: %s', e)
+
+
+def open_store(url, namespace, ttl=TTL, max_bytes=MAX_BYTES):
+    """SharedCurveStore for a sqlite:///path or redis:// URL, or None.
+
+    As in SQLAlchemy URLs, sqlite:///name.db is relative to the working
+    directory and sqlite:////var/tmp/name.db is absolute.
+    """
+    if url.startswith('sqlite:///'):
+        return SharedCurveStore(SQLiteStore(url[len('sqlite:///'):], ttl, max_bytes), namespace)
+    if url.startswith(('redis://', 'rediss://', 'unix://')):
+        try:
+            return SharedCurveStore(RedisStore(url, ttl), namespace)
+        except ImportError:
+            log.warning('IV_SHARED_CACHE is a Redis URL but the redis package is not installed; '
+                        'not sharing solved curves')
+            return None
+    raise ValueError('unsupported shared cache URL: %s' % url)
+
+
+def from_env(namespace):
+    url = os.environ.get('IV_SHARED_CACHE')
+    if not url:
+        return None
+    return open_store(url, namespace, ttl=int(os.environ.get('IV_SHARED_CACHE_TTL', TTL)),
+                      max_bytes=int(float(os.environ.get('IV_SHARED_CACHE_MAX_MB', MAX_BYTES / 2 ** 20)) * 2 ** 20))
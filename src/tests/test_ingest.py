@@ -0,0 +1,30 @@
+import numpy as np
+
+from ingest import extract_parameters
+
+
+def make_trace(stop=1.0, points=100):
+    # Ideal-diode curve with Isc = 9 A and Voc = 40 V, measured up to stop * Voc
+    voltage = np.linspace(0, 40 * stop, points)
+    current = 9 * (1 - np.expm1(voltage / 2) / np.expm1(20))
+    return voltage, current
+
+
+def test_full_trace_interpolates_voc():
+    params = extract_parameters(*make_trace())
+    assert abs(params['Voc'] - 40) < 0.01
+    assert not params['Voc estimated']
+
+
+def test_trace_ending_near_voc_is_extrapolated():
+    params = extract_parameters(*make_trace(stop=0.98))
+    assert abs(params['Voc'] - 40) < 0.5
+    assert not params['Voc estimated']
+
+
+def test_truncated_trace_falls_back_to_measured_voltage():
+    # Stops on the flat part of the curve, where the last segment points far past Voc
+    voltage, current = make_trace(stop=0.5)
+    params = extract_parameters(voltage, current)
+    assert params['Voc'] == voltage[-1]
+    assert params['Voc estimated']
@@ -0,0 +1,42 @@
+import numpy as np
+
+from ivsolver import KEY_PARAMETERS
+from sharedcache import SharedCurveStore, SQLiteStore, decode_curve, encode_curve
+
+
+def make_curve(**extra):
+    curve = {'v': np.linspace(0, 38.5, 75), 'i': np.linspace(9.3, 0, 75)}
+    curve.update(i_sc=9.3, v_oc=38.5, i_mp=8.49, v_mp=30.7, p_mp=260.6)
+    curve.update(extra)
+    return curve
+
+
+def assert_round_trip(curve):
+    decoded = decode_curve(encode_curve(curve))
+    np.testing.assert_array_equal(decoded['v'], curve['v'])
+    np.testing.assert_array_equal(decoded['i'], curve['i'])
+    for name in KEY_PARAMETERS:
+        assert decoded[name] == curve[name]
+    return decoded
+
+
+def test_solved_curve_round_trip():
+    decoded = assert_round_trip(make_curve())
+    assert 'error_bound' not in decoded
+
+
+def test_interpolated_curve_round_trip():
+    bounds = dict(zip(KEY_PARAMETERS, np.array([0.001, 0.002, 0.003, 0.004, 0.005], dtype=np.float32)))
+    decoded = assert_round_trip(make_curve(error_bound=bounds))
+    assert decoded['error_bound'] == {name: float(value) for name, value in bounds.items()}
+
+
+def test_truncated_entry_is_a_miss(tmp_path):
+    store = SharedCurveStore(SQLiteStore(str(tmp_path / 'curves.db')), 'test')
+    key = (1, 1000.0, 25.0)
+    store.set(key, make_curve())
+    assert store.get(key) is not None
+    store.backend.set(store._key(key), encode_curve(make_curve())[:-100])
+    assert store.get(key) is None
+    # The unreadable entry is removed rather than read again
+    assert len(store.backend) == 0